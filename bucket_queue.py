@@ -0,0 +1,48 @@
+from collections import deque
+from typing import Any, Tuple
+
+
+class BucketQueue:
+    """
+    Monotone priority queue for small non-negative integer edge costs
+    (Dial's algorithm). Items live in a circular array of max_edge_cost + 1
+    FIFO buckets indexed by cost, so put() and get() are O(1) amortised
+    instead of the locked O(log n) heap work done by queue.PriorityQueue.
+
+    Mirrors the PriorityQueue interface used by the routers: items are
+    tuples whose first element is the integer priority. Priorities must
+    never be lower than the last one returned by get(), and never more than
+    max_edge_cost above it.
+    """
+
+    def __init__(self, max_edge_cost: int):
+        if max_edge_cost < 0:
+            raise ValueError("Bucket queue needs a non-negative maximum edge cost")
+        self.num_buckets = int(max_edge_cost) + 1
+        self.buckets = [deque() for _ in range(self.num_buckets)]
+        self.current = 0
+        self.size = 0
+
+    def put(self, item: Tuple[Any, ...]):
+        priority = int(item[0])
+        if not self.current <= priority < self.current + self.num_buckets:
+            raise ValueError(f"Priority {priority} outside bucket window starting at {self.current}")
+        self.buckets[priority % self.num_buckets].append(item)
+        self.size += 1
+
+    def get(self) -> Tuple[Any, ...]:
+        if not self.size:
+            raise IndexError("get from an empty bucket queue")
+        bucket = self.buckets[self.current % self.num_buckets]
+        while not bucket:
+            self.current += 1
+            bucket = self.buckets[self.current % self.num_buckets]
+        self.size -= 1
+        return bucket.popleft()
+
+    def empty(self) -> bool:
+        return self.size == 0
+
+    def qsize(self) -> int:
+        return self.size
+
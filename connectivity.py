@@ -0,0 +1,53 @@
+from typing import List
+
+import numpy as np
+
+
+def label_components(layers: List[np.ndarray]) -> np.ndarray:
+    """
+    Connected components of the two-layer routing grid under the routers'
+    move rules: M0 cells join their left/right neighbours, M1 cells their
+    up/down neighbours, and a via joins the two layers where both are free.
+    All moves are reversible, so two free cells have a path between them
+    exactly when they carry the same label.
+
+    Returns a (2, height, width) int array of component ids, -1 on
+    obstacles. Each M0 row run and M1 column run is one node; runs that
+    cross at a free via are merged by repeated min-label hooking with
+    pointer jumping, all in NumPy.
+    """
+    free0 = layers[0] != -1
+    free1 = layers[1] != -1
+    height, width = free0.shape
+
+    # A run starts at every free cell whose predecessor along the layer's
+    # direction is blocked or off-grid; cumulative counts number the runs
+    starts0 = free0.copy()
+    starts0[:, 1:] &= ~free0[:, :-1]
+    run0 = np.cumsum(starts0.ravel()).reshape(height, width) - 1
+    starts1 = free1.copy()
+    starts1[1:, :] &= ~free1[:-1, :]
+    run1 = np.cumsum(starts1.T.ravel()).reshape(width, height).T - 1
+    num_runs0 = int(starts0.sum())
+    run1 += num_runs0
+
+    vias = free0 & free1
+    a, b = run0[vias], run1[vias]
+    labels = np.arange(num_runs0 + int(starts1.sum()))
+    while True:
+        roots_a, roots_b = labels[a], labels[b]
+        if np.array_equal(roots_a, roots_b):
+            break
+        merged = np.minimum(roots_a, roots_b)
+        np.minimum.at(labels, roots_a, merged)
+        np.minimum.at(labels, roots_b, merged)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+    components = np.full((2, height, width), -1, dtype=int)
+    components[0][free0] = labels[run0[free0]]
+    components[1][free1] = labels[run1[free1]]
+    return components
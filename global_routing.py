@@ -0,0 +1,127 @@
+import heapq
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+class GCellGrid:
+    """
+    Coarse routing graph for global routing: the grid cut into
+    gcell_size x gcell_size GCells, joined to their four neighbours.
+
+    The capacity of an edge is the number of tracks crossing its boundary
+    with both boundary cells free. For the edge between GCell (gx, gy)
+    and (gx + 1, gy) these are M0 rows; for the edge between (gx, gy) and
+    (gx, gy + 1) they are M1 columns. Edges with no free track are never
+    used. Crossing an edge costs 1, plus overflow_cost for every net the
+    edge would carry over its capacity, so later nets detour around
+    crowded boundaries.
+    """
+
+    def __init__(self, blocked: np.ndarray, gcell_size: int, overflow_cost: float = 2.0):
+        """blocked is the (2, height, width) bool mask of obstacles and routed wires."""
+        if gcell_size < 1:
+            raise ValueError("GCell size must be at least 1")
+        _, self.height, self.width = blocked.shape
+        self.gcell_size = gcell_size
+        self.overflow_cost = overflow_cost
+        self.columns = -(-self.width // gcell_size)
+        self.rows = -(-self.height // gcell_size)
+
+        # capacity_h[gy, gx]: free M0 rows across the right boundary of (gx, gy)
+        free0, free1 = ~blocked[0], ~blocked[1]
+        boundary_x = np.arange(1, self.columns) * gcell_size
+        crossing = free0[:, boundary_x - 1] & free0[:, boundary_x]
+        self.capacity_h = np.add.reduceat(crossing, np.arange(0, self.height, gcell_size), axis=0).astype(int)
+        # capacity_v[gy, gx]: free M1 columns across the lower boundary of (gx, gy)
+        boundary_y = np.arange(1, self.rows) * gcell_size
+        crossing = free1[boundary_y - 1, :] & free1[boundary_y, :]
+        self.capacity_v = np.add.reduceat(crossing, np.arange(0, self.width, gcell_size), axis=1).astype(int)
+        self.usage_h = np.zeros_like(self.capacity_h)
+        self.usage_v = np.zeros_like(self.capacity_v)
+
+    def gcell(self, x: int, y: int) -> Tuple[int, int]:
+        return x // self.gcell_size, y // self.gcell_size
+
+    def _edge_cost(self, usage: np.ndarray, capacity: np.ndarray, gy: int, gx: int) -> float:
+        return 1 + self.overflow_cost * max(0, usage[gy, gx] + 1 - capacity[gy, gx])
+
+    def _neighbours(self, gx: int, gy: int):
+        """(neighbour, usage array, capacity array, edge index) for every usable edge of a GCell."""
+        if gx + 1 < self.columns and self.capacity_h[gy, gx]:
+            yield (gx + 1, gy), self.usage_h, self.capacity_h, (gy, gx)
+        if gx > 0 and self.capacity_h[gy, gx - 1]:
+            yield (gx - 1, gy), self.usage_h, self.capacity_h, (gy, gx - 1)
+        if gy + 1 < self.rows and self.capacity_v[gy, gx]:
+            yield (gx, gy + 1), self.usage_v, self.capacity_v, (gy, gx)
+        if gy > 0 and self.capacity_v[gy - 1, gx]:
+            yield (gx, gy - 1), self.usage_v, self.capacity_v, (gy - 1, gx)
+
+    def route(self, pins: List[Tuple[int, int, int]]) -> Optional[Set[Tuple[int, int]]]:
+        """
+        Route a net on the GCell graph and add it to the edge usage. The
+        tree grows from the first pin's GCell; each step runs Dijkstra
+        from every GCell in the tree to the nearest unconnected pin GCell.
+        Returns the tree's GCells, or None if some pin cannot be reached.
+        """
+        targets = {self.gcell(x, y) for _, x, y in pins}
+        tree = {self.gcell(pins[0][1], pins[0][2])}
+        targets -= tree
+        used_edges = []
+        while targets:
+            dist = {cell: 0.0 for cell in tree}
+            came_from: Dict[Tuple[int, int], Tuple[Tuple[int, int], np.ndarray, Tuple[int, int]]] = {}
+            heap = [(0.0, cell) for cell in sorted(tree)]
+            heapq.heapify(heap)
+            reached = None
+            while heap:
+                cost, cell = heapq.heappop(heap)
+                if cost > dist[cell]:
+                    continue
+                if cell in targets:
+                    reached = cell
+                    break
+                for nxt, usage, capacity, edge in self._neighbours(*cell):
+                    new_cost = cost + self._edge_cost(usage, capacity, *edge)
+                    if new_cost < dist.get(nxt, float("inf")):
+                        dist[nxt] = new_cost
+                        came_from[nxt] = (cell, usage, edge)
+                        heapq.heappush(heap, (new_cost, nxt))
+            if reached is None:
+                return None
+            cell = reached
+            while cell not in tree:
+                tree.add(cell)
+                cell, usage, edge = came_from[cell]
+                used_edges.append((usage, edge))
+            targets.discard(reached)
+
+        for usage, edge in used_edges:
+            usage[edge] += 1
+        return tree
+
+    def overflow(self) -> int:
+        """Total number of nets carried over capacity, summed over all edges."""
+        return int(np.maximum(self.usage_h - self.capacity_h, 0).sum() +
+                   np.maximum(self.usage_v - self.capacity_v, 0).sum())
+
+    def corridor(self, gcells: Set[Tuple[int, int]], margin: int = 0) -> Tuple[Tuple[int, int, int, int], np.ndarray]:
+        """
+        Grid cells of the given GCells, each grown by margin GCells. Returns
+        the bounding window (x_min, x_max, y_min, y_max) and a bool mask of
+        the corridor cells inside it.
+        """
+        gxs = np.array([gx for gx, _ in gcells])
+        gys = np.array([gy for _, gy in gcells])
+        g_x_min, g_x_max = max(0, gxs.min() - margin), min(self.columns - 1, gxs.max() + margin)
+        g_y_min, g_y_max = max(0, gys.min() - margin), min(self.rows - 1, gys.max() + margin)
+        inside = np.zeros((g_y_max - g_y_min + 1, g_x_max - g_x_min + 1), dtype=bool)
+        for gx, gy in gcells:
+            inside[max(0, gy - margin - g_y_min):gy + margin - g_y_min + 1,
+                   max(0, gx - margin - g_x_min):gx + margin - g_x_min + 1] = True
+
+        size = self.gcell_size
+        window = (g_x_min * size, min(self.width, (g_x_max + 1) * size) - 1,
+                  g_y_min * size, min(self.height, (g_y_max + 1) * size) - 1)
+        mask = np.repeat(np.repeat(inside, size, axis=0), size, axis=1)
+        return window, mask[:window[3] - window[2] + 1, :window[1] - window[0] + 1]
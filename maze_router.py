@@ -7,50 +7,940 @@ Original file is located at
     https://colab.research.google.com/drive/1i9xBgZWnBvSWxjw0RPvHdtZb0bhoPFsr
 """
 
+import heapq
+import os
+import time
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from queue import Queue
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional, Set
 from parser import parse_input_file
+from bucket_queue import BucketQueue
+from connectivity import label_components
+from shared_grid import SharedGrid
+from global_routing import GCellGrid
+
+class SearchBuffers:
+    """
+    Scratch arrays for one search direction, allocated once per router and
+    reused by every search. A cell's dist/came_from entries are only valid
+    when stamp[cell] equals the current generation, so starting a new search
+    is a counter increment instead of an O(grid) fill.
+    """
+
+    def __init__(self, cells: int):
+        self.dist = np.empty(cells, dtype=np.float64)
+        self.came_from = np.empty(cells, dtype=np.int32)
+        self.stamp = np.zeros(cells, dtype=np.uint32)
+        self.settled = np.zeros(cells, dtype=np.uint32)
+        self.frontier = np.empty(cells, dtype=np.int32)
+        self.generation = 0
+
+    def begin(self) -> int:
+        self.generation += 1
+        if self.generation == np.iinfo(np.uint32).max:
+            self.stamp[:] = 0
+            self.settled[:] = 0
+            self.generation = 1
+        return self.generation
+
 
 class LeeRouter:
-    def __init__(self, height: int, width: int, bend_penalty: int, via_penalty: int):
+    ENGINES = ("lee", "flat", "dijkstra", "astar", "bidirectional", "hadlock", "line_probe", "wavefront", "track")
+    # Probe levels tried by the line-probe engine before falling back to Lee
+    LINE_PROBE_LEVELS = 4
+    MULTI_PIN_MODES = ("chain", "steiner")
+    # Steiner branches are multi-source searches, which only these engines have
+    STEINER_ENGINES = ("dijkstra", "astar")
+    # Engines that test every cell they enter against _blocked and so stay
+    # inside a route_global corridor; line_probe reads straight runs from
+    # obstacle_distance
+    CORRIDOR_ENGINES = ("lee", "flat", "dijkstra", "astar", "bidirectional", "hadlock", "wavefront", "track")
+    # route_nets routes in-process below this many nets per pool worker: a
+    # worker process costs more to start than routing a few small nets
+    PARALLEL_NETS_PER_WORKER = 4
+
+    def __init__(self, height: int, width: int, bend_penalty: int, via_penalty: int, engine: str = "lee",
+                 multi_pin: str = "chain", shared_grid: Optional[SharedGrid] = None):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown search engine '{engine}', expected one of {self.ENGINES}")
+        if multi_pin not in self.MULTI_PIN_MODES:
+            raise ValueError(f"Unknown multi-pin mode '{multi_pin}', expected one of {self.MULTI_PIN_MODES}")
+        if multi_pin == "steiner" and engine not in self.STEINER_ENGINES:
+            raise ValueError(f"Multi-pin mode 'steiner' needs one of the engines {self.STEINER_ENGINES}, got '{engine}'")
         self.width = width
         self.height = height
         self.bend_penalty = bend_penalty
         self.via_penalty = via_penalty
-        self.layers = [
-            np.zeros((height, width), dtype=int),
-            np.zeros((height, width), dtype=int)
-        ]
+        self.engine = engine
+        self.multi_pin = multi_pin
+        # With a SharedGrid the grid arrays below live in its shared memory
+        # blocks, see shared_grid.py. An attached (non-owner) router only reads.
+        if shared_grid is not None and (shared_grid.height, shared_grid.width) != (height, width):
+            raise ValueError(f"Shared grid is {shared_grid.height}x{shared_grid.width}, expected {height}x{width}")
+        self.shared_grid = shared_grid
+        # Both layers are views of one (2, H, W) array so that add_obstacles
+        # can stamp many cells with one fancy-indexed assignment
+        self._grid = shared_grid.grid if shared_grid else np.zeros((2, height, width), dtype=int)
+        self.layers = [self._grid[0], self._grid[1]]
+        # occupancy[layer, y, x]: ID of the routed net whose wire holds the
+        # cell, 0 when free. Written by route_net; other nets may not enter.
+        self.occupancy = shared_grid.occupancy if shared_grid else np.zeros((2, height, width), dtype=np.int32)
+        self.net_ids: Dict[str, int] = {}
+        self._net_names: Dict[int, str] = {}
+        # Flat (layer * H * W + y * W + x) mask of obstacles and routed wires
+        # and per-direction search buffers shared by the flat-index engines
+        self._blocked = shared_grid.blocked if shared_grid else np.zeros(2 * height * width, dtype=bool)
+        self._buffers: List[SearchBuffers] = []
+        # Inclusive (x_min, x_max, y_min, y_max) search window, see route_net
+        self._window = (0, width - 1, 0, height - 1)
+        self._window_pins: List[Tuple[int, int, int]] = []
+        self._window_margin: Optional[int] = None
+        self._window_retries = 0
+        # (window, mask) corridor a route_global net is searched in first,
+        # see _search_in_window, and the searches that left it empty-handed
+        self._corridor: Optional[Tuple[Tuple[int, int, int, int], np.ndarray]] = None
+        self.corridor_misses = 0
+        self.global_stats: Dict[str, object] = {}
+        # obstacle_distance[layer][0 or 1][y, x]: steps from (x, y) to the
+        # nearest blocked cell (or one past the grid edge) along the layer's
+        # routing direction, towards lower (0) or higher (1) x on M0 and y
+        # on M1. Kept up to date by _set_blocked; both layers are views of
+        # one (2, 2, H, W) array.
+        if shared_grid:
+            self._obstacle_distance = shared_grid.obstacle_distance
+        else:
+            self._obstacle_distance = np.zeros((2, 2, height, width), dtype=np.int32)
+        self.obstacle_distance = [self._obstacle_distance[0], self._obstacle_distance[1]]
+        if shared_grid is None or shared_grid.owner:
+            self._rebuild_obstacle_distance()
+        # Component labels from label_components, rebuilt after obstacle changes
+        self._components: Optional[np.ndarray] = None
+        self.track_graph_stats: Dict[str, int] = {}
+        # Per-tile and per-phase report of the last route_tiled call
+        self.tile_stats: Dict[str, object] = {}
         self.routed_nets: Dict[str, Tuple[List[Tuple[int, int, int]], float]] = {}
+        # For incremental (ECO) changes: the pins and window margin each net
+        # was routed with, and the nets an add_obstacle left without a route
+        # (with the error)
+        self.net_pins: Dict[str, Tuple[List[Tuple[int, int, int]], Optional[int]]] = {}
+        self.unrouted_nets: Dict[str, str] = {}
+        # Pins held blocked in _blocked for the nets, not yet routed, that
+        # list them, see reserve_pins
+        self.pin_reservations: Dict[Tuple[int, int, int], Set[str]] = {}
+        # Cells popped from the frontier, in total and per routed net
+        self.nodes_expanded = 0
+        self.line_probe_fallbacks = 0
+        self.net_stats: Dict[str, Dict[str, object]] = {}
 
     def add_obstacle(self, layer: int, x: int, y: int):
+        """
+        Block a cell. Works after routing too: only the routed nets whose
+        path crosses the cell are ripped up and rerouted, and any that can
+        no longer be routed move to unrouted_nets.
+        """
         if 0 <= layer < 2 and 0 <= x < self.width and 0 <= y < self.height:
+            if self.layers[layer][y, x] == -1:
+                return
             self.layers[layer][y, x] = -1
+            self._components = None
+            owner = int(self.occupancy[layer, y, x])
+            affected = set(self._nets_with_pin((layer, x, y)))
+            if owner:
+                affected.add(self._net_names[owner])
+            self._set_blocked(layer, x, y, True)
+            for net_name in sorted(affected):
+                try:
+                    self.reroute_net(net_name)
+                except ValueError:
+                    pass
+
+    def add_obstacles(self, obstacles):
+        """
+        Block many cells at once. obstacles is an (n, 3) int array of
+        (layer, x, y) rows, as parse_input_file(..., as_arrays=True) returns,
+        or any sequence of such triples. Out-of-grid rows are ignored, as in
+        add_obstacle. The grid is stamped with one fancy-indexed assignment
+        and obstacle_distance is rebuilt in one vectorised pass. Routed nets
+        on the new obstacles are rerouted as in add_obstacle.
+        """
+        obstacles = np.asarray(obstacles, dtype=int).reshape(-1, 3)
+        layer, x, y = obstacles.T
+        inside = (0 <= layer) & (layer < 2) & (0 <= x) & (x < self.width) & (0 <= y) & (y < self.height)
+        layer, x, y = layer[inside], x[inside], y[inside]
+        new = self._grid[layer, y, x] != -1
+        if not new.any():
+            return
+        layer, x, y = layer[new], x[new], y[new]
+
+        affected = {self._net_names[int(owner)] for owner in np.unique(self.occupancy[layer, y, x]) if owner}
+        if self.net_pins:
+            cells = set(zip(layer.tolist(), x.tolist(), y.tolist()))
+            affected.update(net_name for net_name, (pins, _) in self.net_pins.items()
+                            if net_name in self.routed_nets and cells.intersection(self._adjust_pins(pins)))
+
+        self._grid[layer, y, x] = -1
+        self._blocked.reshape(2, self.height, self.width)[layer, y, x] = True
+        self._rebuild_obstacle_distance()
+        self._components = None
+        for net_name in sorted(affected):
+            try:
+                self.reroute_net(net_name)
+            except ValueError:
+                pass
+
+    def _rebuild_obstacle_distance(self):
+        """Recompute obstacle_distance from _blocked for the whole grid with running maxima and minima."""
+        blocked = self._blocked.reshape(2, self.height, self.width)
+        for layer, axis in ((0, 1), (1, 0)):
+            size = blocked.shape[axis + 1]
+            positions = np.arange(size).reshape((1, size) if axis == 1 else (size, 1))
+            # Nearest blocked position at or before / at or after each cell
+            last = np.maximum.accumulate(np.where(blocked[layer], positions, -1), axis=axis)
+            following = np.flip(np.minimum.accumulate(np.flip(np.where(blocked[layer], positions, size), axis=axis),
+                                                      axis=axis), axis=axis)
+            # Shift to strictly before / after, which is what a blocked cell keeps too
+            if axis == 1:
+                last = np.concatenate((np.full((self.height, 1), -1), last[:, :-1]), axis=1)
+                following = np.concatenate((following[:, 1:], np.full((self.height, 1), size)), axis=1)
+            else:
+                last = np.concatenate((np.full((1, self.width), -1), last[:-1, :]), axis=0)
+                following = np.concatenate((following[1:, :], np.full((1, self.width), size)), axis=0)
+            self._obstacle_distance[layer] = np.stack((positions - last, following - positions))
+
+    def _set_blocked(self, layer: int, x: int, y: int, blocked: bool):
+        """
+        Block or free a cell in _blocked and patch obstacle_distance. Only
+        the free run the cell splits or joins changes, so this is
+        O(run length), not a rebuild.
+        """
+        cell = (layer * self.height + y) * self.width + x
+        if self._blocked[cell] == blocked:
+            return
+        self._blocked[cell] = blocked
+        lower, higher = self.obstacle_distance[layer]
+        if layer == 0:
+            line_lower, line_higher, pos, size = lower[y, :], higher[y, :], x, self.width
+        else:
+            line_lower, line_higher, pos, size = lower[:, x], higher[:, x], y, self.height
+        # A blocked cell keeps the distances to the blocked cells beyond it
+        before = pos - int(line_lower[pos])
+        after = pos + int(line_higher[pos])
+        if blocked:
+            # Split (before, after) at pos
+            line_higher[max(before, 0):pos] = pos - np.arange(max(before, 0), pos)
+            line_lower[pos + 1:min(after, size - 1) + 1] = np.arange(pos + 1, min(after, size - 1) + 1) - pos
+        else:
+            # Join the runs on both sides of pos into (before, after)
+            line_higher[max(before, 0):after] = after - np.arange(max(before, 0), after)
+            line_lower[before + 1:min(after, size - 1) + 1] = np.arange(before + 1, min(after, size - 1) + 1) - before
+
+    def _adjust_pins(self, pins: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        return [(max(0, min(int(layer), 1)), max(0, min(int(x), self.width - 1)), max(0, min(int(y), self.height - 1)))
+                for layer, x, y in pins]
+
+    def _nets_with_pin(self, pin: Tuple[int, int, int], exclude: Optional[str] = None) -> List[str]:
+        """Routed nets, other than exclude, that have a pin on the (layer, x, y) cell."""
+        return [net_name for net_name, (pins, _) in self.net_pins.items()
+                if net_name != exclude and net_name in self.routed_nets and pin in self._adjust_pins(pins)]
 
-    def route_net(self, net_name: str, pins: List[Tuple[int, int, int]]) -> Tuple[List[Tuple[int, int, int]], float]:
+    def reserve_pins(self, nets: Dict[str, List[Tuple[int, int, int]]]):
+        """
+        Block the pins of nets that will be routed later, so that no net
+        routed before them runs its wire over one. A reserved pin can only
+        be entered by the nets that list it. A net's reservations end when
+        it is routed or removed, or when route_nets, route_tiled or
+        route_global give up on it. Those reserve the pins of all their
+        nets before routing any.
+        """
+        for net_name, pins in nets.items():
+            if net_name in self.routed_nets:
+                continue
+            for layer, x, y in self._adjust_pins(pins):
+                self.pin_reservations.setdefault((layer, x, y), set()).add(net_name)
+                self._set_blocked(layer, x, y, True)
+
+    def _release_reservations(self, net_name: str, pins: List[Tuple[int, int, int]]):
+        """End a net's pin reservations, freeing the pins nothing else holds."""
+        for layer, x, y in pins:
+            holders = self.pin_reservations.get((layer, x, y))
+            if holders is None or net_name not in holders:
+                continue
+            holders.discard(net_name)
+            if not holders:
+                del self.pin_reservations[(layer, x, y)]
+                if not self.occupancy[layer, y, x] and self.layers[layer][y, x] != -1:
+                    self._set_blocked(layer, x, y, False)
+
+    def _commit_path(self, net_id: int, path: List[Tuple[int, int, int]]):
+        """
+        Write a routed net's wire into occupancy so other nets cannot enter
+        it. A pin shared with a net routed earlier stays with that net.
+        """
+        for layer, x, y in path:
+            if not self.occupancy[layer, y, x]:
+                self.occupancy[layer, y, x] = net_id
+                self._set_blocked(layer, x, y, True)
+
+    def _release_path(self, net_name: str, path: List[Tuple[int, int, int]]):
+        """
+        Free the cells of a net's wire, except those that became obstacles.
+        Its pins shared with other routed nets pass to one of them.
+        """
+        net_id = self.net_ids[net_name]
+        for layer, x, y in path:
+            if self.occupancy[layer, y, x] == net_id:
+                self.occupancy[layer, y, x] = 0
+                if self.layers[layer][y, x] != -1 and (layer, x, y) not in self.pin_reservations:
+                    self._set_blocked(layer, x, y, False)
+        if path:
+            for layer, x, y in self._adjust_pins(self.net_pins[net_name][0]):
+                sharing = self._nets_with_pin((layer, x, y), exclude=net_name)
+                if sharing and not self.occupancy[layer, y, x]:
+                    self.occupancy[layer, y, x] = self.net_ids[sharing[0]]
+                    self._set_blocked(layer, x, y, True)
+
+    def can_run_straight(self, layer: int, x: int, y: int, to: int) -> bool:
+        """
+        True when a straight wire on `layer` can go from (x, y) to coordinate
+        `to` along the layer's direction (x on M0, y on M1) without entering
+        a blocked cell. O(1) through obstacle_distance.
+        """
+        pos = x if layer == 0 else y
+        if to == pos:
+            return True
+        direction = 1 if to > pos else 0
+        return self.obstacle_distance[layer][direction][y, x] > abs(to - pos)
+
+    def pins_connected(self, pin_a: Tuple[int, int, int], pin_b: Tuple[int, int, int]) -> bool:
+        """
+        True when some legal path joins the two (layer, x, y) pins around
+        the obstacles. O(1) after the component labels are built once per
+        obstacle state. Routed wires are not considered, so with nets routed
+        a search may still fail. A pin on an obstacle is never connected.
+        """
+        if self._components is None:
+            self._components = label_components(self.layers)
+        (layer_a, x_a, y_a), (layer_b, x_b, y_b) = pin_a, pin_b
+        label_a = self._components[layer_a, y_a, x_a]
+        return bool(label_a >= 0 and label_a == self._components[layer_b, y_b, x_b])
+
+    def route_net(self, net_name: str, pins: List[Tuple[int, int, int]],
+                  window_margin: Optional[int] = None) -> Tuple[List[Tuple[int, int, int]], float]:
+        """
+        Route a net through its pins. With window_margin set, every search is
+        first confined to the pins' bounding box grown by that margin; when
+        a segment finds no path the margin doubles (plus one) and the segment
+        is retried, until the window covers the whole grid. Retries are
+        counted in net_stats[net_name]["window_retries"]. Pins that cannot
+        reach each other are rejected before any search.
+
+        The routed wire is written to occupancy and blocks every later net,
+        except at pins the nets share. Pins reserved with reserve_pins are
+        entered the same way. Routing a net again first frees its old wire,
+        which is restored if the new route fails.
+        """
         if len(pins) < 2:
             raise ValueError("Net must have at least two pins")
 
-        adjusted_pins = [(max(0, min(layer, 1)), max(0, min(x, self.width - 1)), max(0, min(y, self.height - 1)))
-                         for layer, x, y in pins]
+        if net_name not in self.net_ids:
+            self.net_ids[net_name] = len(self.net_ids) + 1
+            self._net_names[self.net_ids[net_name]] = net_name
+        net_id = self.net_ids[net_name]
+        previous = self.routed_nets.get(net_name, ((), 0.0))[0]
+        self._release_path(net_name, previous)
+
+        adjusted_pins = self._adjust_pins(pins)
+        self._window_pins = adjusted_pins
+        self._window_margin = window_margin
+        self._window_retries = 0
+        self._update_window()
+        # Pins held by another net are enterable only if they are its pins
+        # too; a reserved pin is held by no wire and reserved for this net
+        shared_pins = []
+        try:
+            for layer, x, y in adjusted_pins:
+                owner = int(self.occupancy[layer, y, x])
+                if owner and owner != net_id:
+                    owner_name = self._net_names[owner]
+                    if (layer, x, y) not in self._adjust_pins(self.net_pins[owner_name][0]):
+                        raise ValueError(f"Pin {(layer, x, y)} is covered by the wire of net {owner_name}")
+                elif owner or (layer, x, y) not in self.pin_reservations or self.layers[layer][y, x] == -1:
+                    continue
+                shared_pins.append((layer, x, y))
+                self._set_blocked(layer, x, y, False)
+            for pin in adjusted_pins[1:]:
+                if not self.pins_connected(adjusted_pins[0], pin):
+                    raise ValueError(f"No valid path found from {adjusted_pins[0]} to {pin}")
+            if self.multi_pin == "steiner":
+                full_path, total_cost = self._route_net_steiner(net_name, adjusted_pins)
+            else:
+                full_path, total_cost = self._route_net_chain(net_name, adjusted_pins)
+        except ValueError:
+            self._commit_path(net_id, previous)
+            raise
+        finally:
+            for layer, x, y in shared_pins:
+                self._set_blocked(layer, x, y, True)
+            self._window_margin = None
+            self._update_window()
+        self._commit_path(net_id, full_path)
+        self._release_reservations(net_name, adjusted_pins)
+        self.net_stats[net_name]["window_retries"] = self._window_retries
+        self.net_pins[net_name] = (list(pins), window_margin)
+        self.unrouted_nets.pop(net_name, None)
+        return full_path, total_cost
+
+    def add_net(self, net_name: str, pins: List[Tuple[int, int, int]],
+                window_margin: Optional[int] = None) -> Tuple[List[Tuple[int, int, int]], float]:
+        """Route a new net into the existing routing. Raises ValueError if the name is taken."""
+        if net_name in self.routed_nets:
+            raise ValueError(f"Net {net_name} is already routed, use reroute_net")
+        return self.route_net(net_name, pins, window_margin)
+
+    def remove_net(self, net_name: str):
+        """Rip up a routed (or unroutable) net and forget its pins."""
+        if net_name not in self.net_pins:
+            raise ValueError(f"Net {net_name} is not routed")
+        path, _ = self.routed_nets.pop(net_name, ((), 0.0))
+        self._release_path(net_name, path)
+        self._release_reservations(net_name, self._adjust_pins(self.net_pins[net_name][0]))
+        del self.net_pins[net_name]
+        self.net_stats.pop(net_name, None)
+        self.unrouted_nets.pop(net_name, None)
+
+    def reroute_net(self, net_name: str, pins: Optional[List[Tuple[int, int, int]]] = None,
+                    window_margin: Optional[int] = None) -> Tuple[List[Tuple[int, int, int]], float]:
+        """
+        Rip up and reroute one net, through new pins if given or else the
+        pins and window margin it was routed with. If no route exists the
+        old one is removed, the net moves to unrouted_nets and the
+        ValueError is raised.
+        """
+        if net_name not in self.net_pins:
+            raise ValueError(f"Net {net_name} is not routed")
+        if pins is None:
+            pins, window_margin = self.net_pins[net_name]
+        try:
+            return self.route_net(net_name, pins, window_margin)
+        except ValueError as e:
+            path, _ = self.routed_nets.pop(net_name, ((), 0.0))
+            self._release_path(net_name, path)
+            self.net_pins[net_name] = (list(pins), window_margin)
+            self.unrouted_nets[net_name] = str(e)
+            raise
+
+    def route_nets(self, nets: Dict[str, List[Tuple[int, int, int]]], window_margin: Optional[int] = None,
+                   max_workers: int = 1) -> Dict[str, str]:
+        """
+        Route nets in net_priority order and return {net_name: error} for
+        the ones that fail. With max_workers > 1 and a window_margin, nets
+        whose search windows do not overlap are routed concurrently in
+        worker processes, each on a copy of its window only. routed_nets,
+        its order and the output of save_routing are the same as with
+        max_workers=1. The pool is only used when the machine has more
+        than one CPU and there are at least PARALLEL_NETS_PER_WORKER nets
+        per worker; otherwise the nets are routed in-process.
+        """
+        order = sorted(nets.items(), key=net_priority)
+        self.reserve_pins(nets)
+        max_workers = min(max_workers, os.cpu_count() or 1, len(order) // self.PARALLEL_NETS_PER_WORKER)
+        if max_workers <= 1 or window_margin is None:
+            failures = {}
+            for net_name, pins in order:
+                try:
+                    self.route_net(net_name, pins, window_margin)
+                except ValueError as e:
+                    failures[net_name] = str(e)
+                    self._release_reservations(net_name, self._adjust_pins(pins))
+            return failures
+        return self._route_nets_parallel(order, window_margin, max_workers)
+
+    def _route_nets_parallel(self, order: List[Tuple[str, List[Tuple[int, int, int]]]], window_margin: int,
+                             max_workers: int) -> Dict[str, str]:
+        """
+        Route nets in waves. A net joins the current wave unless its window
+        overlaps the window of a wave net or of an earlier net still
+        waiting, so inside its window it sees exactly the wires serial
+        routing would show it. Wave nets are routed on window copies in a
+        process pool and committed here.
+
+        A net that finds no path in its window, is routed again, or has too
+        few pins is a barrier. It waits until every earlier net is done and
+        is then routed here by route_net, window growth included. Later nets
+        already committed are lifted for it, with their pins reserved again,
+        and the ones whose window its wire enters are routed again.
+        """
+        routed_before = list(self.routed_nets)
+        windows: List[Optional[Tuple[int, int, int, int]]] = []
+        barriers = set()
+        seen = set(self.routed_nets) | set(self.net_pins)
+        for i, (net_name, pins) in enumerate(order):
+            if len(pins) < 2 or net_name in seen:
+                barriers.add(i)
+                windows.append(None)
+            else:
+                windows.append(self._pin_window(self._adjust_pins(pins), window_margin))
+            seen.add(net_name)
+            # Net ids in the order serial routing would hand them out
+            if len(pins) >= 2 and net_name not in self.net_ids:
+                self.net_ids[net_name] = len(self.net_ids) + 1
+                self._net_names[self.net_ids[net_name]] = net_name
+
+        succeeded = set()
+        failures: Dict[str, str] = {}
+        remaining = list(range(len(order)))
+        with self._process_pool(max_workers) as pool:
+            while remaining:
+                if remaining[0] in barriers:
+                    barrier = remaining.pop(0)
+                    redo = self._route_barrier(order, windows, barrier, succeeded, failures, window_margin)
+                    remaining = sorted(remaining + redo)
+                    continue
+
+                wave, waiting = [], []
+                for i in remaining:
+                    if i in barriers:
+                        break
+                    if any(_windows_overlap(windows[i], windows[k]) for k in wave + waiting):
+                        waiting.append(i)
+                    else:
+                        wave.append(i)
+                if len(wave) == 1:
+                    results = [_route_window_task(self._window_task(*order[wave[0]], windows[wave[0]], True))]
+                else:
+                    tasks = [self._window_task(*order[i], windows[i], self.shared_grid is None) for i in wave]
+                    results = list(pool.map(_route_window_task, tasks,
+                                            chunksize=max(1, len(tasks) // (4 * max_workers))))
+
+                for i, result in zip(wave, results):
+                    if result is None:
+                        barriers.add(i)
+                        continue
+                    remaining.remove(i)
+                    path, cost, stats, expanded, fallbacks = result
+                    x_min, _, y_min, _ = windows[i]
+                    path = [(layer, x + x_min, y + y_min) for layer, x, y in path]
+                    net_name, pins = order[i]
+                    self._restore_net(net_name, (path, cost), stats, (list(pins), window_margin))
+                    self.nodes_expanded += expanded
+                    self.line_probe_fallbacks += fallbacks
+                    succeeded.add(i)
+
+        # Serial routing adds each net to routed_nets when it first succeeds
+        first_routed = {}
+        for i in sorted(succeeded):
+            first_routed.setdefault(order[i][0], i)
+        names = routed_before + sorted((name for name in first_routed if name not in routed_before),
+                                       key=first_routed.get)
+        self.routed_nets = {name: self.routed_nets[name] for name in names if name in self.routed_nets}
+        return failures
+
+    def _process_pool(self, max_workers: int) -> ProcessPoolExecutor:
+        """
+        Worker pool for route_nets and route_tiled. Workers of a router on a
+        SharedGrid attach to it once and read their windows from it, instead
+        of receiving a copy with every task.
+        """
+        if self.shared_grid is None:
+            return ProcessPoolExecutor(max_workers=max_workers)
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=_attach_worker_grid,
+                                   initargs=(self.shared_grid.spec,))
+
+    def route_tiled(self, nets: Dict[str, List[Tuple[int, int, int]]], tile_size: int, max_workers: int = 1,
+                    window_margin: Optional[int] = None) -> Dict[str, str]:
+        """
+        Partitioned routing for large grids. The grid is cut into
+        tile_size x tile_size tiles. Nets whose pins all lie in one tile are
+        routed first, each tile on its own tile-sized LeeRouter in
+        net_priority order, in a process pool when max_workers > 1. The
+        other nets, and tile nets that find no path inside their tile, are
+        then routed on the full grid by route_nets, around the tile wires.
+
+        Returns {net_name: error} for the nets that fail. tile_stats gets
+        each tile's net counts, routing time and expanded cells, the time
+        of both phases and the load balance: the slowest tile's time over
+        the mean tile time, 1.0 when the tiles took equally long.
+        """
+        if tile_size < 1:
+            raise ValueError("Tile size must be at least 1")
+        start_time = time.perf_counter()
+        self.reserve_pins(nets)
+        tiles: Dict[Tuple[int, int], List[Tuple[str, List[Tuple[int, int, int]]]]] = {}
+        stitched: Dict[str, List[Tuple[int, int, int]]] = {}
+        for net_name, pins in sorted(nets.items(), key=net_priority):
+            adjusted = self._adjust_pins(pins)
+            pin_tiles = {(x // tile_size, y // tile_size) for _, x, y in adjusted}
+            if len(pins) >= 2 and len(pin_tiles) == 1 and net_name not in self.net_pins:
+                tiles.setdefault(pin_tiles.pop(), []).append((net_name, adjusted))
+                if net_name not in self.net_ids:
+                    self.net_ids[net_name] = len(self.net_ids) + 1
+                    self._net_names[self.net_ids[net_name]] = net_name
+            else:
+                stitched[net_name] = pins
+
+        windows = {(tile_x, tile_y): (tile_x * tile_size, min(self.width, (tile_x + 1) * tile_size) - 1,
+                                      tile_y * tile_size, min(self.height, (tile_y + 1) * tile_size) - 1)
+                   for tile_x, tile_y in tiles}
+        # Busiest tiles first, so that no worker starts a big tile last
+        busiest = sorted(tiles, key=lambda tile: -len(tiles[tile]))
+        parallel = max_workers > 1 and len(tiles) > 1
+        tasks = [self._tile_task(tile, windows[tile], tiles[tile], not parallel or self.shared_grid is None,
+                                 window_margin) for tile in busiest]
+        if parallel:
+            with self._process_pool(max_workers) as pool:
+                results = list(pool.map(_route_tile_task, tasks))
+        else:
+            results = [_route_tile_task(task) for task in tasks]
+        results = {result[0]: result for result in results}
+
+        tile_stats = []
+        for tile in sorted(tiles):
+            _, routed, tile_time, expanded = results[tile]
+            x_min, _, y_min, _ = windows[tile]
+            for net_name, pins in tiles[tile]:
+                if isinstance(routed[net_name], str):
+                    stitched[net_name] = nets[net_name]
+                    continue
+                path, cost, stats = routed[net_name]
+                path = [(layer, x + x_min, y + y_min) for layer, x, y in path]
+                self._restore_net(net_name, (path, cost), stats, (list(nets[net_name]), window_margin))
+            self.nodes_expanded += expanded
+            deferred = sum(isinstance(result, str) for result in routed.values())
+            tile_stats.append({"tile": tile, "nets": len(tiles[tile]), "routed": len(routed) - deferred,
+                               "deferred": deferred, "time": tile_time, "expanded": expanded})
+        tile_phase_time = time.perf_counter() - start_time
+
+        failures = self.route_nets(stitched, window_margin, max_workers)
+        tile_times = [stats["time"] for stats in tile_stats] or [0.0]
+        self.tile_stats = {
+            "tiles": tile_stats,
+            "tile_nets": sum(stats["nets"] for stats in tile_stats),
+            "deferred_nets": sum(stats["deferred"] for stats in tile_stats),
+            "stitched_nets": len(stitched),
+            "tile_phase_time": tile_phase_time,
+            "stitch_time": time.perf_counter() - start_time - tile_phase_time,
+            "load_balance": max(tile_times) / (sum(tile_times) / len(tile_times)) if sum(tile_times) else 1.0,
+        }
+        return failures
+
+    def route_global(self, nets: Dict[str, List[Tuple[int, int, int]]], gcell_size: int, corridor_margin: int = 0,
+                     window_margin: Optional[int] = None) -> Dict[str, str]:
+        """
+        Two-level routing. A GCellGrid built from the current blockages
+        first routes every net on the coarse graph in net_priority order;
+        edge usage steers later nets away from full GCell boundaries. Each
+        net is then routed in detail by route_net, with every search first
+        restricted to its corridor: the cells of its GCells, grown by
+        corridor_margin GCells. A search that finds no path in the corridor
+        falls back to the normal window search and counts as a corridor
+        miss. Nets the coarse graph cannot connect get no corridor.
+
+        Returns {net_name: error} for the nets that fail. global_stats gets
+        the GCell grid size, its overflow, the corridor misses, the mean
+        corridor area as a fraction of the grid and the time and expanded
+        cells of both stages.
+        """
+        if self.engine not in self.CORRIDOR_ENGINES:
+            raise ValueError(f"Engine '{self.engine}' cannot search in a corridor, use one of {self.CORRIDOR_ENGINES}")
+        start_time = time.perf_counter()
+        self.reserve_pins(nets)
+        gcells = GCellGrid(self._blocked.reshape(2, self.height, self.width), gcell_size)
+        order = sorted(nets.items(), key=net_priority)
+        corridors = {}
+        for net_name, pins in order:
+            if len(pins) >= 2:
+                tree = gcells.route(self._adjust_pins(pins))
+                if tree is not None:
+                    corridors[net_name] = gcells.corridor(tree, corridor_margin)
+        global_time = time.perf_counter() - start_time
+
+        misses_before = self.corridor_misses
+        expanded_before = self.nodes_expanded
+        nets_with_misses = 0
+        failures = {}
+        for net_name, pins in order:
+            misses = self.corridor_misses
+            self._corridor = corridors.get(net_name)
+            try:
+                self.route_net(net_name, pins, window_margin)
+            except ValueError as e:
+                failures[net_name] = str(e)
+                self._release_reservations(net_name, self._adjust_pins(pins))
+            finally:
+                self._corridor = None
+            nets_with_misses += self.corridor_misses > misses
+
+        areas = [int(np.count_nonzero(inside)) / (self.height * self.width) for _, inside in corridors.values()]
+        self.global_stats = {
+            "gcells": (gcells.columns, gcells.rows),
+            "overflow": gcells.overflow(),
+            "without_corridor": sum(len(pins) >= 2 for net_name, pins in order if net_name not in corridors),
+            "corridor_misses": self.corridor_misses - misses_before,
+            "nets_with_misses": nets_with_misses,
+            "corridor_area": sum(areas) / len(areas) if areas else 0.0,
+            "global_time": global_time,
+            "detailed_time": time.perf_counter() - start_time - global_time,
+            "expanded": self.nodes_expanded - expanded_before,
+        }
+        return failures
+
+    def _tile_task(self, tile: Tuple[int, int], window: Tuple[int, int, int, int],
+                   nets: List[Tuple[str, List[Tuple[int, int, int]]]], copy_window: bool,
+                   window_margin: Optional[int]):
+        """
+        Everything a worker needs to route a tile's nets: the tile's
+        obstacles (unless the worker reads them from its SharedGrid), the
+        routed wires crossing it with their pins and the reserved pins in
+        it by net, in tile coordinates.
+        """
+        x_min, x_max, y_min, y_max = window
+        obstacles = None
+        if copy_window:
+            obstacles = self._grid[:, y_min:y_max + 1, x_min:x_max + 1] == -1
+        occupancy = self.occupancy[:, y_min:y_max + 1, x_min:x_max + 1]
+        wires = {}
+        for owner in np.unique(occupancy[occupancy > 0]):
+            net_name = self._net_names[int(owner)]
+            layer, y, x = np.nonzero(occupancy == owner)
+            pins = [(pin_layer, pin_x - x_min, pin_y - y_min)
+                    for pin_layer, pin_x, pin_y in self._adjust_pins(self.net_pins[net_name][0])
+                    if x_min <= pin_x <= x_max and y_min <= pin_y <= y_max]
+            wires[net_name] = (list(zip(layer.tolist(), x.tolist(), y.tolist())), pins)
+        reserved: Dict[str, List[Tuple[int, int, int]]] = {}
+        for (layer, x, y), holders in self.pin_reservations.items():
+            if x_min <= x <= x_max and y_min <= y <= y_max:
+                for net_name in holders:
+                    reserved.setdefault(net_name, []).append((layer, x - x_min, y - y_min))
+        local_nets = [(net_name, [(layer, x - x_min, y - y_min) for layer, x, y in pins]) for net_name, pins in nets]
+        return (tile, window, local_nets, obstacles, wires, reserved,
+                self.bend_penalty, self.via_penalty, self.engine, self.multi_pin, window_margin)
+
+    def _route_barrier(self, order: List[Tuple[str, List[Tuple[int, int, int]]]],
+                       windows: List[Optional[Tuple[int, int, int, int]]], barrier: int, succeeded: set,
+                       failures: Dict[str, str], window_margin: int) -> List[int]:
+        """Route a barrier net as serial routing would; return the later nets that must be routed again."""
+        net_name, pins = order[barrier]
+        adjusted_pins = self._adjust_pins(pins)
+        later = sorted(i for i in succeeded if i > barrier)
+        if len(pins) < 2 or not all(self.pins_connected(adjusted_pins[0], pin) for pin in adjusted_pins[1:]):
+            # route_net fails before any search, whatever the wires; only a
+            # later wire on one of its pins could change the error
+            later = [i for i in later if set(adjusted_pins).intersection(self.routed_nets[order[i][0]][0])]
+        lifted = {}
+        for i in later:
+            lifted[i] = (self.routed_nets[order[i][0]], self.net_stats[order[i][0]], self.net_pins[order[i][0]])
+            self.remove_net(order[i][0])
+            self.reserve_pins({order[i][0]: order[i][1]})
+
+        path = []
+        try:
+            path, _ = self.route_net(net_name, pins, window_margin)
+            succeeded.add(barrier)
+            failures.pop(net_name, None)
+        except ValueError as e:
+            failures[net_name] = str(e)
+            self._release_reservations(net_name, adjusted_pins)
+
+        redo = []
+        cells = np.array(path, dtype=int).reshape(-1, 3)
+        for i in later:
+            x_min, x_max, y_min, y_max = windows[i]
+            if np.any((cells[:, 1] >= x_min) & (cells[:, 1] <= x_max) & (cells[:, 2] >= y_min) & (cells[:, 2] <= y_max)):
+                succeeded.discard(i)
+                redo.append(i)
+            else:
+                self._restore_net(order[i][0], *lifted[i])
+        return redo
+
+    def _restore_net(self, net_name: str, routed: Tuple[List[Tuple[int, int, int]], float],
+                     stats: Dict[str, object], net_pins: Tuple[List[Tuple[int, int, int]], Optional[int]]):
+        """Commit an already routed path for a net without searching."""
+        self._commit_path(self.net_ids[net_name], routed[0])
+        self._release_reservations(net_name, self._adjust_pins(net_pins[0]))
+        self.routed_nets[net_name] = routed
+        self.net_stats[net_name] = stats
+        self.net_pins[net_name] = net_pins
+        self.unrouted_nets.pop(net_name, None)
+
+    def _window_task(self, net_name: str, pins: List[Tuple[int, int, int]], window: Tuple[int, int, int, int],
+                     copy_window: bool):
+        """
+        Everything a worker needs to route a net on a copy of its window.
+        Without copy_window the worker copies the window from its SharedGrid.
+        """
+        x_min, x_max, y_min, y_max = window
+        blocked = None
+        if copy_window:
+            blocked = _window_blocked(self._blocked, self.height, self.width, window)
+        local_pins, enterable = [], []
+        for layer, x, y in self._adjust_pins(pins):
+            owner = int(self.occupancy[layer, y, x])
+            # A pin it shares with a routed net, or one reserved for it, stays
+            # enterable, as in route_net
+            if owner and (layer, x, y) in self._adjust_pins(self.net_pins[self._net_names[owner]][0]):
+                enterable.append((layer, x - x_min, y - y_min))
+            elif not owner and (layer, x, y) in self.pin_reservations and self.layers[layer][y, x] != -1:
+                enterable.append((layer, x - x_min, y - y_min))
+            local_pins.append((layer, x - x_min, y - y_min))
+        return (net_name, local_pins, window, enterable, blocked,
+                self.bend_penalty, self.via_penalty, self.engine, self.multi_pin)
+
+    def _update_window(self):
+        if self._window_margin is None:
+            self._window = (0, self.width - 1, 0, self.height - 1)
+            return
+        self._window = self._pin_window(self._window_pins, self._window_margin)
+
+    def _pin_window(self, adjusted_pins: List[Tuple[int, int, int]], margin: int) -> Tuple[int, int, int, int]:
+        """The pins' bounding box grown by margin and clipped to the grid, as (x_min, x_max, y_min, y_max)."""
+        xs = [x for _, x, _ in adjusted_pins]
+        ys = [y for _, _, y in adjusted_pins]
+        return (max(0, min(xs) - margin), min(self.width - 1, max(xs) + margin),
+                max(0, min(ys) - margin), min(self.height - 1, max(ys) + margin))
 
+    def _search_in_window(self, search, *args):
+        """
+        Run search(*args), growing the window and retrying while it finds no
+        path. With a corridor set, it is tried inside the corridor first.
+        """
+        if self._corridor is not None:
+            result = self._search_in_corridor(search, *args)
+            if result is not None:
+                return result
+            self.corridor_misses += 1
+        while True:
+            try:
+                return search(*args)
+            except ValueError:
+                if self._window == (0, self.width - 1, 0, self.height - 1):
+                    raise
+                self._window_margin = 2 * self._window_margin + 1
+                self._window_retries += 1
+                self._update_window()
+
+    def _search_in_corridor(self, search, *args):
+        """
+        Run search(*args) in the corridor's window with the cells outside the
+        corridor blocked for the time of the search. None when it finds no
+        path there.
+        """
+        (x_min, x_max, y_min, y_max), inside = self._corridor
+        blocked = self._blocked.reshape(2, self.height, self.width)[:, y_min:y_max + 1, x_min:x_max + 1]
+        masked = ~inside & ~blocked
+        blocked[masked] = True
+        window = self._window
+        self._window = self._corridor[0]
+        try:
+            return search(*args)
+        except ValueError:
+            return None
+        finally:
+            blocked[masked] = False
+            self._window = window
+
+    def _route_net_chain(self, net_name: str, adjusted_pins: List[Tuple[int, int, int]]) -> Tuple[List[Tuple[int, int, int]], float]:
         full_path = []
         total_cost = 0
+        segment_expanded = []
 
         for i in range(len(adjusted_pins) - 1):
             start_layer, start_x, start_y = adjusted_pins[i]
             end_layer, end_x, end_y = adjusted_pins[i + 1]
 
-            path, cost = self._lee_route(start_layer, start_x, start_y, end_layer, end_x, end_y)
+            expanded_before = self.nodes_expanded
+            path, cost = self._search_in_window(self._route_segment, start_layer, start_x, start_y, end_layer, end_x, end_y)
+            segment_expanded.append(self.nodes_expanded - expanded_before)
             if not full_path:
                 full_path.extend(path)
             else:
                 full_path.extend(path[1:])
             total_cost += cost
         self.routed_nets[net_name] = (full_path, total_cost)
+        self.net_stats[net_name] = {
+            "segments": len(adjusted_pins) - 1,
+            "expanded": sum(segment_expanded),
+            "segment_expanded": segment_expanded,
+        }
+        return full_path, total_cost
+
+    def _route_net_steiner(self, net_name: str, adjusted_pins: List[Tuple[int, int, int]]) -> Tuple[List[Tuple[int, int, int]], float]:
+        """
+        Grow a Steiner tree from the first pin: each step connects the
+        unconnected pin nearest (Manhattan) to the tree, with one search
+        seeded from every cell routed so far. Uses A* for engine="astar" and
+        Dijkstra for engine="dijkstra", the only engines allowed with
+        multi_pin="steiner". Each branch after the first is appended to the
+        path starting at the tree cell it joins.
+        """
+        width = self.width
+        plane = self.height * width
+
+        first_layer, first_x, first_y = adjusted_pins[0]
+        tree_cells = [first_layer * plane + first_y * width + first_x]
+        tree_set = set(tree_cells)
+        tree_xs = np.array([first_x])
+        tree_ys = np.array([first_y])
+
+        full_path = [adjusted_pins[0]]
+        total_cost = 0
+        segment_expanded = []
+        remaining = list(adjusted_pins[1:])
+
+        while remaining:
+            distances = [int(np.min(np.abs(tree_xs - x) + np.abs(tree_ys - y))) for _, x, y in remaining]
+            pin_layer, pin_x, pin_y = remaining.pop(distances.index(min(distances)))
+            pin = pin_layer * plane + pin_y * width + pin_x
+            if pin in tree_set:
+                segment_expanded.append(0)
+                continue
+
+            expanded_before = self.nodes_expanded
+            path, cost = self._search_in_window(self._steiner_branch, net_name, tree_cells, pin_layer, pin_x, pin_y)
+            segment_expanded.append(self.nodes_expanded - expanded_before)
+
+            full_path.extend(path[1:] if path[0] == full_path[-1] else path)
+            total_cost += cost
+            new_cells = [(layer, x, y) for layer, x, y in path if layer * plane + y * width + x not in tree_set]
+            for layer, x, y in new_cells:
+                tree_cells.append(layer * plane + y * width + x)
+                tree_set.add(tree_cells[-1])
+            tree_xs = np.concatenate((tree_xs, [x for _, x, _ in new_cells]))
+            tree_ys = np.concatenate((tree_ys, [y for _, _, y in new_cells]))
+
+        self.routed_nets[net_name] = (full_path, total_cost)
+        self.net_stats[net_name] = {
+            "segments": len(adjusted_pins) - 1,
+            "expanded": sum(segment_expanded),
+            "segment_expanded": segment_expanded,
+        }
         return full_path, total_cost
 
+    def _steiner_branch(self, net_name: str, tree_cells: List[int], pin_layer: int, pin_x: int, pin_y: int) -> Tuple[List[Tuple[int, int, int]], float]:
+        path, cost = self._best_first_route(tree_cells, pin_layer, pin_x, pin_y, use_heuristic=self.engine == "astar")
+        if path is None:
+            raise ValueError(f"No valid path found from the routed tree of {net_name} to {(pin_layer, pin_x, pin_y)}")
+        return path, cost
+
+    def _route_segment(self, start_layer: int, start_x: int, start_y: int, end_layer: int, end_x: int, end_y: int) -> Tuple[List[Tuple[int, int, int]], float]:
+        if self.engine == "flat":
+            return self._lee_route_flat(start_layer, start_x, start_y, end_layer, end_x, end_y)
+        if self.engine == "dijkstra":
+            return self._dijkstra_route(start_layer, start_x, start_y, end_layer, end_x, end_y)
+        if self.engine == "astar":
+            return self._astar_route(start_layer, start_x, start_y, end_layer, end_x, end_y)
+        if self.engine == "bidirectional":
+            return self._bidirectional_route(start_layer, start_x, start_y, end_layer, end_x, end_y)
+        if self.engine == "hadlock":
+            return self._hadlock_route(start_layer, start_x, start_y, end_layer, end_x, end_y)
+        if self.engine == "line_probe":
+            return self._line_probe_route(start_layer, start_x, start_y, end_layer, end_x, end_y)
+        if self.engine == "wavefront":
+            return self._wavefront_route(start_layer, start_x, start_y, end_layer, end_x, end_y)
+        if self.engine == "track":
+            return self._track_route(start_layer, start_x, start_y, end_layer, end_x, end_y)
+        return self._lee_route(start_layer, start_x, start_y, end_layer, end_x, end_y)
+
     def _lee_route(self, start_layer: int, start_x: int, start_y: int, end_layer: int, end_x: int, end_y: int) -> Tuple[List[Tuple[int, int, int]], float]:
         directions = [
             (1, 0, 0), (-1, 0, 0),
@@ -58,27 +948,42 @@ class LeeRouter:
             (0, 0, 1), (0, 0, -1)
         ]
 
-        wave_grid = [np.full((self.height, self.width), np.inf) for _ in range(2)]
-        wave_grid[start_layer][start_y, start_x] = 0
+        width = self.width
+        plane = self.height * width
+
+        # Costs and predecessors live in the shared, generation-stamped
+        # buffers; a cell not stamped in this search is still at infinity
+        buffers = self._search_buffers(0)
+        generation = buffers.begin()
+        dist, came_from, stamp = buffers.dist, buffers.came_from, buffers.stamp
+
+        start = start_layer * plane + start_y * width + start_x
+        end = end_layer * plane + end_y * width + end_x
+        dist[start] = 0
+        came_from[start] = -1
+        stamp[start] = generation
 
         queue = Queue()
         queue.put((start_layer, start_x, start_y))
 
-        came_from = {}
+        x_min, x_max, y_min, y_max = self._window
 
         while not queue.empty():
             curr_layer, curr_x, curr_y = queue.get()
+            self.nodes_expanded += 1
 
             if (curr_layer, curr_x, curr_y) == (end_layer, end_x, end_y):
                 break
 
+            curr = curr_layer * plane + curr_y * width + curr_x
             for dx, dy, dlayer in directions:
                 new_layer = curr_layer + dlayer
                 new_x, new_y = curr_x + dx, curr_y + dy
 
-                if not (0 <= new_layer < 2 and 0 <= new_x < self.width and 0 <= new_y < self.height):
+                if not (0 <= new_layer < 2 and x_min <= new_x <= x_max and y_min <= new_y <= y_max):
                     continue
-                if self.layers[new_layer][new_y, new_x] == -1:
+                nxt = new_layer * plane + new_y * width + new_x
+                if self._blocked[nxt]:
                     continue
 
                 if curr_layer == 0 and dy != 0:
@@ -93,23 +998,791 @@ class LeeRouter:
                     if not (new_x == end_x or new_y == end_y) or new_layer != end_layer:
                       move_cost += self.bend_penalty
 
-                new_cost = wave_grid[curr_layer][curr_y, curr_x] + move_cost
-                if new_cost < wave_grid[new_layer][new_y, new_x]:
-                    wave_grid[new_layer][new_y, new_x] = new_cost
+                new_cost = dist[curr] + move_cost
+                if stamp[nxt] != generation or new_cost < dist[nxt]:
+                    dist[nxt] = new_cost
+                    came_from[nxt] = curr
+                    stamp[nxt] = generation
                     queue.put((new_layer, new_x, new_y))
-                    came_from[(new_layer, new_x, new_y)] = (curr_layer, curr_x, curr_y)
 
-        if np.isinf(wave_grid[end_layer][end_y, end_x]):
+        if stamp[end] != generation:
             raise ValueError(f"No valid path found from {(start_layer, start_x, start_y)} to {(end_layer, end_x, end_y)}")
 
         path = []
-        curr_pos = (end_layer, end_x, end_y)
-        while curr_pos != (start_layer, start_x, start_y):
-            path.append(curr_pos)
-            curr_pos = came_from[curr_pos]
-        path.append((start_layer, start_x, start_y))
+        curr = end
+        while curr != -1:
+            layer, rem = divmod(curr, plane)
+            y, x = divmod(rem, width)
+            path.append((layer, x, y))
+            curr = int(came_from[curr])
+
+        return path[::-1], float(dist[end])
+
+    def _lee_route_flat(self, start_layer: int, start_x: int, start_y: int, end_layer: int, end_x: int, end_y: int) -> Tuple[List[Tuple[int, int, int]], float]:
+        """
+        Same wave expansion as _lee_route, but on flat cell indices
+        (layer * H * W + y * W + x) with an int32 ring-buffer frontier and an
+        int32 predecessor array instead of a Queue and a tuple-keyed dict.
+        Visits cells in the same order, so paths and costs are identical.
+        """
+        width = self.width
+        plane = self.height * width
+
+        buffers = self._search_buffers(0)
+        generation = buffers.begin()
+        blocked = self._blocked
+        dist, came_from, stamp = buffers.dist, buffers.came_from, buffers.stamp
+
+        start = start_layer * plane + start_y * width + start_x
+        end = end_layer * plane + end_y * width + end_x
+        dist[start] = 0
+        came_from[start] = -1
+        stamp[start] = generation
+
+        frontier = buffers.frontier
+        capacity = len(frontier)
+        frontier[0] = start
+        head, size = 0, 1
+
+        via_cost = self.via_penalty
+        via_bend_cost = self.via_penalty + self.bend_penalty
+        x_min, x_max, y_min, y_max = self._window
+        neighbours = [0, 0, 0]
+
+        while size:
+            curr = int(frontier[head])
+            head += 1
+            if head == capacity:
+                head = 0
+            size -= 1
+            self.nodes_expanded += 1
+
+            if curr == end:
+                break
+
+            curr_layer, rem = divmod(curr, plane)
+            curr_y, curr_x = divmod(rem, width)
+            curr_cost = dist[curr]
+
+            # M0 only moves along x, M1 only along y; the via is tried last
+            if curr_layer == 0:
+                neighbours[0] = curr + 1 if curr_x < x_max else -1
+                neighbours[1] = curr - 1 if curr_x > x_min else -1
+                neighbours[2] = curr + plane
+                via_layer = 1
+            else:
+                neighbours[0] = curr + width if curr_y < y_max else -1
+                neighbours[1] = curr - width if curr_y > y_min else -1
+                neighbours[2] = curr - plane
+                via_layer = 0
+
+            for k in range(3):
+                nxt = neighbours[k]
+                if nxt < 0 or blocked[nxt]:
+                    continue
+
+                if k < 2:
+                    new_cost = curr_cost + 1
+                elif (curr_x == end_x or curr_y == end_y) and via_layer == end_layer:
+                    new_cost = curr_cost + via_cost
+                else:
+                    new_cost = curr_cost + via_bend_cost
+
+                if stamp[nxt] != generation or new_cost < dist[nxt]:
+                    dist[nxt] = new_cost
+                    came_from[nxt] = curr
+                    stamp[nxt] = generation
+                    if size == capacity:
+                        frontier = np.concatenate((frontier[head:], frontier[:head], np.empty(capacity, dtype=np.int32)))
+                        buffers.frontier = frontier
+                        head = 0
+                        capacity *= 2
+                    tail = head + size
+                    if tail >= capacity:
+                        tail -= capacity
+                    frontier[tail] = nxt
+                    size += 1
+
+        if stamp[end] != generation:
+            raise ValueError(f"No valid path found from {(start_layer, start_x, start_y)} to {(end_layer, end_x, end_y)}")
+
+        return self._trace_flat(came_from, end), dist[end]
+
+    def _dijkstra_route(self, start_layer: int, start_x: int, start_y: int, end_layer: int, end_x: int, end_y: int) -> Tuple[List[Tuple[int, int, int]], float]:
+        """
+        Label-setting Dijkstra over (layer, x, y) states. Each state is
+        settled at most once and the search stops as soon as the target is
+        settled, so the returned cost is optimal under the via/bend costs.
+        """
+        start = start_layer * self.height * self.width + start_y * self.width + start_x
+        path, cost = self._best_first_route([start], end_layer, end_x, end_y, use_heuristic=False)
+        if path is None:
+            raise ValueError(f"No valid path found from {(start_layer, start_x, start_y)} to {(end_layer, end_x, end_y)}")
+        return path, cost
+
+    def _astar_route(self, start_layer: int, start_x: int, start_y: int, end_layer: int, end_x: int, end_y: int) -> Tuple[List[Tuple[int, int, int]], float]:
+        """
+        A* over (layer, x, y) states guided by _heuristic. The heuristic is
+        consistent, so settled states are final and the path is as cheap as
+        the one _dijkstra_route finds while expanding far fewer cells.
+        """
+        start = start_layer * self.height * self.width + start_y * self.width + start_x
+        path, cost = self._best_first_route([start], end_layer, end_x, end_y, use_heuristic=True)
+        if path is None:
+            raise ValueError(f"No valid path found from {(start_layer, start_x, start_y)} to {(end_layer, end_x, end_y)}")
+        return path, cost
+
+    def _best_first_route(self, sources: List[int], end_layer: int, end_x: int, end_y: int, use_heuristic: bool) -> Tuple[List[Tuple[int, int, int]], float]:
+        """
+        Shared Dijkstra/A* search from every flat cell in `sources` (all at
+        cost 0) to the target. Returns (None, inf) when the target cannot be
+        reached.
+        """
+        width = self.width
+        plane = self.height * width
+
+        buffers = self._search_buffers(0)
+        generation = buffers.begin()
+        blocked = self._blocked
+        dist, came_from, stamp, settled = buffers.dist, buffers.came_from, buffers.stamp, buffers.settled
+        end = end_layer * plane + end_y * width + end_x
+
+        # Ties on f are broken towards the smaller h, i.e. the deeper state
+        heap = []
+        for source in sources:
+            dist[source] = 0
+            came_from[source] = -1
+            stamp[source] = generation
+            h = 0
+            if use_heuristic:
+                source_layer, rem = divmod(source, plane)
+                h = self._heuristic(source_layer, rem % width, rem // width, end_layer, end_x, end_y)
+            heap.append((h, h, source))
+        heapq.heapify(heap)
+
+        while heap:
+            _, _, curr = heapq.heappop(heap)
+            if settled[curr] == generation:
+                continue
+            settled[curr] = generation
+            self.nodes_expanded += 1
+
+            if curr == end:
+                break
+
+            curr_cost = dist[curr]
+            for nxt, move_cost in self._flat_moves(curr, end_layer, end_x, end_y):
+                if blocked[nxt] or settled[nxt] == generation:
+                    continue
+                new_cost = curr_cost + move_cost
+                if stamp[nxt] != generation or new_cost < dist[nxt]:
+                    dist[nxt] = new_cost
+                    came_from[nxt] = curr
+                    stamp[nxt] = generation
+                    h = 0
+                    if use_heuristic:
+                        nxt_layer, rem = divmod(nxt, plane)
+                        h = self._heuristic(nxt_layer, rem % width, rem // width, end_layer, end_x, end_y)
+                    heapq.heappush(heap, (new_cost + h, h, nxt))
+
+        if settled[end] != generation:
+            return None, np.inf
+
+        return self._trace_flat(came_from, end), dist[end]
+
+    def _bidirectional_route(self, start_layer: int, start_x: int, start_y: int, end_layer: int, end_x: int, end_y: int) -> Tuple[List[Tuple[int, int, int]], float]:
+        """
+        Bidirectional Dijkstra: one wave grows from the source over forward
+        moves, the other from the target over reversed moves, always expanding
+        the smaller frontier. The best meeting cell is kept and the search
+        stops once the two frontier minima add up to at least its cost.
+        """
+        width = self.width
+        plane = self.height * width
 
-        return path[::-1], wave_grid[end_layer][end_y, end_x]
+        start = start_layer * plane + start_y * width + start_x
+        end = end_layer * plane + end_y * width + end_x
+        if start == end:
+            self.nodes_expanded += 1
+            return [(start_layer, start_x, start_y)], 0.0
+
+        blocked = self._blocked
+        if blocked[end]:
+            raise ValueError(f"No valid path found from {(start_layer, start_x, start_y)} to {(end_layer, end_x, end_y)}")
+
+        # Index 0 is the forward wave, index 1 the backward one
+        buffers = [self._search_buffers(0), self._search_buffers(1)]
+        generations = [buffers[0].begin(), buffers[1].begin()]
+        dist = [buffers[0].dist, buffers[1].dist]
+        came_from = [buffers[0].came_from, buffers[1].came_from]
+        stamp = [buffers[0].stamp, buffers[1].stamp]
+        settled = [buffers[0].settled, buffers[1].settled]
+        for side, source in ((0, start), (1, end)):
+            dist[side][source] = 0
+            came_from[side][source] = -1
+            stamp[side][source] = generations[side]
+        heaps = [[(0, start)], [(0, end)]]
+
+        best_cost, meet = np.inf, -1
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best_cost:
+                break
+
+            side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+            generation, other_generation = generations[side], generations[1 - side]
+            curr_cost, curr = heapq.heappop(heaps[side])
+            if settled[side][curr] == generation:
+                continue
+            settled[side][curr] = generation
+            self.nodes_expanded += 1
+
+            if side == 0:
+                moves = self._flat_moves(curr, end_layer, end_x, end_y)
+            else:
+                moves = self._flat_moves_reversed(curr, end_layer, end_x, end_y)
+
+            own_dist, own_stamp, other_dist, other_stamp = dist[side], stamp[side], dist[1 - side], stamp[1 - side]
+            for nxt, move_cost in moves:
+                # The forward wave may leave a blocked source pin, so the backward one may enter it
+                if (blocked[nxt] and nxt != start) or settled[side][nxt] == generation:
+                    continue
+                new_cost = curr_cost + move_cost
+                if own_stamp[nxt] != generation or new_cost < own_dist[nxt]:
+                    own_dist[nxt] = new_cost
+                    came_from[side][nxt] = curr
+                    own_stamp[nxt] = generation
+                    heapq.heappush(heaps[side], (new_cost, nxt))
+                    if other_stamp[nxt] == other_generation and new_cost + other_dist[nxt] < best_cost:
+                        best_cost, meet = new_cost + other_dist[nxt], nxt
+
+        if meet < 0:
+            raise ValueError(f"No valid path found from {(start_layer, start_x, start_y)} to {(end_layer, end_x, end_y)}")
+
+        # Forward half runs start -> meet; the backward predecessors lead meet -> end
+        path = self._trace_flat(came_from[0], meet) if meet != start else [(start_layer, start_x, start_y)]
+        curr = meet
+        while curr != end:
+            curr = int(came_from[1][curr])
+            curr_layer, rem = divmod(curr, plane)
+            path.append((curr_layer, rem % width, rem // width))
+
+        return path, best_cost
+
+    def _hadlock_route(self, start_layer: int, start_x: int, start_y: int, end_layer: int, end_x: int, end_y: int) -> Tuple[List[Tuple[int, int, int]], float]:
+        """
+        Hadlock's minimum-detour router. Cells are ordered by detour cost:
+        what a move costs beyond the Manhattan progress it makes, i.e. 0 for a
+        step towards the target, 2 for a step away and the via cost for a
+        layer change. Detour costs are small integers, so the frontier is a
+        BucketQueue and each cell is settled once, with an optimal path.
+        """
+        width = self.width
+        plane = self.height * width
+
+        buffers = self._search_buffers(0)
+        generation = buffers.begin()
+        blocked = self._blocked
+        dist, came_from, stamp, settled = buffers.dist, buffers.came_from, buffers.stamp, buffers.settled
+
+        start = start_layer * plane + start_y * width + start_x
+        end = end_layer * plane + end_y * width + end_x
+        dist[start] = 0
+        came_from[start] = -1
+        stamp[start] = generation
+
+        start_distance = abs(start_x - end_x) + abs(start_y - end_y)
+        queue = BucketQueue(max(2, self.via_penalty + self.bend_penalty))
+        queue.put((0, start))
+        while not queue.empty():
+            _, curr = queue.get()
+            if settled[curr] == generation:
+                continue
+            settled[curr] = generation
+            self.nodes_expanded += 1
+
+            if curr == end:
+                break
+
+            curr_cost = dist[curr]
+            for nxt, move_cost in self._flat_moves(curr, end_layer, end_x, end_y):
+                if blocked[nxt] or settled[nxt] == generation:
+                    continue
+                new_cost = curr_cost + move_cost
+                if stamp[nxt] != generation or new_cost < dist[nxt]:
+                    dist[nxt] = new_cost
+                    came_from[nxt] = curr
+                    stamp[nxt] = generation
+                    rem = nxt % plane
+                    detour = new_cost + abs(rem % width - end_x) + abs(rem // width - end_y) - start_distance
+                    queue.put((int(detour), nxt))
+
+        if settled[end] != generation:
+            raise ValueError(f"No valid path found from {(start_layer, start_x, start_y)} to {(end_layer, end_x, end_y)}")
+
+        return self._trace_flat(came_from, end), dist[end]
+
+    def _wavefront_route(self, start_layer: int, start_x: int, start_y: int, end_layer: int, end_x: int, end_y: int) -> Tuple[List[Tuple[int, int, int]], float]:
+        """
+        Vectorised Lee wave for unit costs. With no bend penalty and a via
+        penalty of 0 or 1 every move costs 0 or 1, so the wave is a BFS:
+        each front is a boolean array, shifted along x on M0 and along y on
+        M1, plus the layer swap, and masked by free unvisited cells. Any other
+        penalties fall back to _dijkstra_route.
+        """
+        if self.bend_penalty != 0 or self.via_penalty not in (0, 1):
+            return self._dijkstra_route(start_layer, start_x, start_y, end_layer, end_x, end_y)
+
+        x_min, x_max, y_min, y_max = self._window
+        free = ~self._blocked.reshape(2, self.height, self.width)[:, y_min:y_max + 1, x_min:x_max + 1]
+        start = (start_layer, start_y - y_min, start_x - x_min)
+        end = (end_layer, end_y - y_min, end_x - x_min)
+        via_cost = self.via_penalty
+
+        dist = np.full(free.shape, -1, dtype=np.int32)
+        front = np.zeros(free.shape, dtype=bool)
+        front[start] = True
+        visited = front.copy()
+        dist[start] = 0
+
+        wave = 0
+        while True:
+            if via_cost == 0:
+                # Free vias join the other layer to the current front
+                swapped = front[::-1] & free & ~visited
+                front |= swapped
+                visited |= swapped
+                dist[swapped] = wave
+            self.nodes_expanded += int(np.count_nonzero(front))
+            if visited[end]:
+                break
+
+            grown = np.zeros_like(front)
+            grown[0, :, 1:] |= front[0, :, :-1]
+            grown[0, :, :-1] |= front[0, :, 1:]
+            grown[1, 1:, :] |= front[1, :-1, :]
+            grown[1, :-1, :] |= front[1, 1:, :]
+            if via_cost == 1:
+                grown |= front[::-1]
+            grown &= free & ~visited
+            if not grown.any():
+                break
+            wave += 1
+            dist[grown] = wave
+            visited |= grown
+            front = grown
+
+        if not visited[end]:
+            raise ValueError(f"No valid path found from {(start_layer, start_x, start_y)} to {(end_layer, end_x, end_y)}")
+
+        # Trace back through cells one wave closer, preferring planar moves
+        # and never taking two vias in a row
+        path = [end]
+        layer, y, x = end
+        just_via = False
+        while (layer, y, x) != start:
+            wave = dist[layer, y, x]
+            if layer == 0:
+                steps = [(0, y, x - 1), (0, y, x + 1)]
+            else:
+                steps = [(1, y - 1, x), (1, y + 1, x)]
+            for cell in steps:
+                if 0 <= cell[1] < dist.shape[1] and 0 <= cell[2] < dist.shape[2] and dist[cell] == wave - 1 and dist[cell] >= 0:
+                    layer, y, x = cell
+                    just_via = False
+                    break
+            else:
+                if just_via or dist[1 - layer, y, x] != wave - via_cost:
+                    raise RuntimeError("Wavefront trace-back lost the path")
+                layer = 1 - layer
+                just_via = True
+            path.append((layer, y, x))
+
+        cells = [(layer, x + x_min, y + y_min) for layer, y, x in path[::-1]]
+        return cells, self._path_cost(cells, end_layer, end_x, end_y)
+
+    def _track_route(self, start_layer: int, start_x: int, start_y: int, end_layer: int, end_x: int, end_y: int) -> Tuple[List[Tuple[int, int, int]], float]:
+        """
+        Exact search over tracks instead of cells. A track is a maximal free
+        run inside the window, a row run on M0 or a column run on M1; the
+        tracks are the graph's nodes and the via points where a row run
+        crosses a column run its edges. Popping a track relaxes all of it at
+        once: every cell gets the best entry plus its distance along the
+        track, in two cumulative-minimum passes. Each cell that improved
+        offers its cost plus the via cost as an entry of the crossing track,
+        unless that cell is already reached as cheaply. Tracks are popped
+        by their best pending entry plus the _heuristic lower bound from it,
+        as in A*, and the search stops once no pending entry can beat the
+        target. The result is traced back into the usual per-cell path.
+        """
+        x_min, x_max, y_min, y_max = self._window
+        plane = self.height * self.width
+        if self._blocked[end_layer * plane + end_y * self.width + end_x]:
+            raise ValueError(f"No valid path found from {(start_layer, start_x, start_y)} to {(end_layer, end_x, end_y)}")
+
+        # free[0][y, x] holds M0 and free[1][x, y] M1, both relative to the
+        # window, so every track is part of one array row. A via from
+        # free[layer][row, col] lands on free[1 - layer][col, row].
+        blocked = self._blocked.reshape(2, self.height, self.width)[:, y_min:y_max + 1, x_min:x_max + 1]
+        free = [~blocked[0], (~blocked[1]).T.copy()]
+        ex, ey = end_x - x_min, end_y - y_min
+        # Vectorised _heuristic of an entry onto each layer, beyond the
+        # Manhattan distance: the vias it still needs
+        if end_layer == 0:
+            vias_left = (lambda xs, ys: np.where(ys == ey, 0, 2 * self.via_penalty + self.bend_penalty),
+                         lambda xs, ys: self.via_penalty)
+        else:
+            vias_left = (lambda xs, ys: self.via_penalty,
+                         lambda xs, ys: np.where(xs == ex, 0, 2 * self.via_penalty + self.bend_penalty))
+        start = (0, start_y - y_min, start_x - x_min) if start_layer == 0 else (1, start_x - x_min, start_y - y_min)
+        end = (0, ey, ex) if end_layer == 0 else (1, ex, ey)
+        free[start[0]][start[1:]] = True
+
+        track_ids = []
+        track_rows, track_first, track_last, track_layer = [], [], [], []
+        for layer in range(2):
+            first = free[layer].copy()
+            first[:, 1:] &= ~free[layer][:, :-1]
+            last = free[layer].copy()
+            last[:, :-1] &= ~free[layer][:, 1:]
+            ids = np.cumsum(first).reshape(first.shape) - 1 + sum(len(rows) for rows in track_rows)
+            ids[~free[layer]] = -1
+            track_ids.append(ids)
+            rows, cols = np.nonzero(first)
+            track_rows.append(rows)
+            track_first.append(cols)
+            track_last.append(np.nonzero(last)[1])
+            track_layer.append(np.full(len(rows), layer))
+        track_rows, track_first, track_last, track_layer = (
+            np.concatenate(arrays) for arrays in (track_rows, track_first, track_last, track_layer))
+
+        dist = [np.full(cells.shape, np.inf) for cells in free]
+        entry = [np.full(cells.shape, np.inf) for cells in free]
+        pending = np.full(len(track_rows), np.inf)
+        entry[start[0]][start[1:]] = 0
+        pending[track_ids[start[0]][start[1:]]] = 0
+        heap = [(0, int(track_ids[start[0]][start[1:]]))]
+        pops = 0
+        while heap:
+            key, track = heapq.heappop(heap)
+            if key >= dist[end[0]][end[1:]]:
+                break
+            if key != pending[track]:
+                continue
+            pending[track] = np.inf
+            pops += 1
+
+            layer, row = track_layer[track], track_rows[track]
+            first, last = track_first[track], track_last[track] + 1
+            along = np.arange(last - first)
+            cost = np.minimum.accumulate(entry[layer][row, first:last] - along) + along
+            cost = np.minimum.accumulate((cost + along)[::-1])[::-1] - along
+            improved = np.nonzero(cost < dist[layer][row, first:last])[0]
+            dist[layer][row, first:last] = cost
+            self.nodes_expanded += len(along)
+
+            other = 1 - layer
+            cols = improved + first
+            via = free[other][cols, row]
+            cols, cost = cols[via], cost[improved[via]]
+            xs, ys = (cols, row) if layer == 0 else (row, cols)
+            aligned = ((xs == ex) | (ys == ey)) & (other == end_layer)
+            cost = cost + self.via_penalty + np.where(aligned, 0, self.bend_penalty)
+            better = cost < np.minimum(entry[other][cols, row], dist[other][cols, row])
+            cols, cost = cols[better], cost[better]
+            entry[other][cols, row] = cost
+            # A row crosses every column once, so each crossing track gets
+            # at most one entry here
+            xs, ys = xs[better] if layer == 0 else xs, ys[better] if layer == 1 else ys
+            crossing = track_ids[other][cols, row]
+            key = cost + np.abs(xs - ex) + np.abs(ys - ey) + vias_left[other](xs, ys)
+            better = key < pending[crossing]
+            pending[crossing[better]] = key[better]
+            for nxt, nxt_key in zip(crossing[better].tolist(), key[better].tolist()):
+                heapq.heappush(heap, (nxt_key, nxt))
+
+        self.track_graph_stats = {
+            "tracks": len(track_rows),
+            "via_points": int(np.count_nonzero(free[0] & free[1].T)),
+            "popped": pops,
+            "grid_nodes": 2 * free[0].size,
+        }
+        if dist[end[0]][end[1:]] == np.inf:
+            raise ValueError(f"No valid path found from {(start_layer, start_x, start_y)} to {(end_layer, end_x, end_y)}")
+
+        # Trace back along tracks to a neighbour one step cheaper, else
+        # through the via the cell was entered by, never two vias in a row
+        path = [end]
+        layer, row, col = end
+        just_via = False
+        while (layer, row, col) != start:
+            cost = dist[layer][row, col]
+            for step in (col - 1, col + 1):
+                if 0 <= step < dist[layer].shape[1] and abs(dist[layer][row, step] + 1 - cost) < 1e-9:
+                    col = step
+                    just_via = False
+                    break
+            else:
+                if just_via:
+                    raise RuntimeError("Track trace-back lost the path")
+                layer, row, col = 1 - layer, col, row
+                just_via = True
+            path.append((layer, row, col))
+
+        cells = [(layer, col + x_min, row + y_min) if layer == 0 else (layer, row + x_min, col + y_min)
+                 for layer, row, col in path[::-1]]
+        return cells, self._path_cost(cells, end_layer, end_x, end_y)
+
+    def _line_probe_route(self, start_layer: int, start_x: int, start_y: int, end_layer: int, end_x: int, end_y: int) -> Tuple[List[Tuple[int, int, int]], float]:
+        """
+        Mikami-Tabuchi line search. A probe is a maximal free run:
+        a row on M0 or a column on M1. Level 0 is the probe through each pin.
+        Level k + 1 adds the perpendicular probes reachable by a via from any
+        point of a level-k probe. Source and target probes grow alternately
+        until one from each side meet, at a via where a row crosses a column
+        or along a shared run. Only probes are stored, never per-cell search
+        state. When LINE_PROBE_LEVELS levels give no meeting, the segment is
+        routed by the flat Lee engine instead.
+        """
+        width = self.width
+        plane = self.height * width
+        if self._blocked[end_layer * plane + end_y * width + end_x]:
+            raise ValueError(f"No valid path found from {(start_layer, start_x, start_y)} to {(end_layer, end_x, end_y)}")
+
+        # Per side: probe key (layer, fixed coordinate, run start) -> (run end, entry point, parent key)
+        sides = [{}, {}]
+        frontiers = [[], []]
+        for side, (layer, x, y) in enumerate(((start_layer, start_x, start_y), (end_layer, end_x, end_y))):
+            key, run_end = self._probe(layer, x, y)
+            sides[side][key] = (run_end, (x, y), None)
+            frontiers[side].append(key)
+            self.nodes_expanded += run_end - key[2] + 1
+
+        meeting = self._probe_meeting(sides[0], frontiers[0], sides[1])
+        for _ in range(self.LINE_PROBE_LEVELS):
+            if meeting:
+                break
+            for side in (0, 1):
+                frontiers[side] = self._grow_probes(sides[side], frontiers[side])
+                if side == 0:
+                    meeting = self._probe_meeting(sides[0], frontiers[0], sides[1])
+                else:
+                    meeting = self._probe_meeting(sides[1], frontiers[1], sides[0])
+                    if meeting:
+                        meeting = (meeting[1], meeting[0], meeting[2])
+                if meeting:
+                    break
+
+        if not meeting:
+            self.line_probe_fallbacks += 1
+            return self._lee_route_flat(start_layer, start_x, start_y, end_layer, end_x, end_y)
+
+        source_key, target_key, (meet_x, meet_y) = meeting
+        waypoints = self._probe_chain(sides[0], source_key)
+        waypoints.append((source_key[0], meet_x, meet_y))
+        waypoints.append((target_key[0], meet_x, meet_y))
+        waypoints.extend(self._probe_chain(sides[1], target_key)[::-1])
+
+        path = self._expand_waypoints(waypoints)
+        return path, self._path_cost(path, end_layer, end_x, end_y)
+
+    def _probe(self, layer: int, x: int, y: int) -> Tuple[Tuple[int, int, int], int]:
+        """The probe through (x, y) on `layer`, as (key, run end). The cell itself is not checked."""
+        x_min, x_max, y_min, y_max = self._window
+        lower, higher = self.obstacle_distance[layer]
+        if layer == 0:
+            pos, low, high, fixed = x, x_min, x_max, y
+        else:
+            pos, low, high, fixed = y, y_min, y_max, x
+        run_start = max(pos - int(lower[y, x]) + 1, low)
+        run_end = min(pos + int(higher[y, x]) - 1, high)
+        return (layer, fixed, run_start), run_end
+
+    def _grow_probes(self, probes: Dict, frontier: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        """Add the perpendicular probes reachable by a via from every point of the frontier probes."""
+        width = self.width
+        plane = self.height * width
+        new_frontier = []
+        for key in frontier:
+            layer, fixed, run_start = key
+            run_end = probes[key][0]
+            other = 1 - layer
+            for pos in range(run_start, run_end + 1):
+                x, y = (pos, fixed) if layer == 0 else (fixed, pos)
+                if self._blocked[other * plane + y * width + x]:
+                    continue
+                child, child_end = self._probe(other, x, y)
+                if child in probes:
+                    continue
+                probes[child] = (child_end, (x, y), key)
+                new_frontier.append(child)
+                self.nodes_expanded += child_end - child[2] + 1
+        return new_frontier
+
+    def _probe_meeting(self, probes: Dict, new_keys: List[Tuple[int, int, int]], others: Dict):
+        """First (new probe, other-side probe, (x, y)) pair that connects, or None."""
+        for key in new_keys:
+            layer, fixed, run_start = key
+            run_end = probes[key][0]
+            for other_key, (other_end, other_entry, _) in others.items():
+                other_layer, other_fixed, other_start = other_key
+                if other_key == key:
+                    return key, other_key, other_entry
+                if other_layer == layer:
+                    continue
+                # A row on M0 crossing a column on M1 meets at a via
+                if run_start <= other_fixed <= run_end and other_start <= fixed <= other_end:
+                    return key, other_key, (other_fixed, fixed) if layer == 0 else (fixed, other_fixed)
+        return None
+
+    def _probe_chain(self, probes: Dict, key: Tuple[int, int, int]) -> List[Tuple[int, int, int]]:
+        """Waypoints from the side's pin to the entry point of probe `key`."""
+        chain = []
+        while key is not None:
+            _, (x, y), parent = probes[key]
+            chain.append((key[0], x, y))
+            if parent is not None:
+                chain.append((parent[0], x, y))
+            key = parent
+        return chain[::-1]
+
+    def _expand_waypoints(self, waypoints: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        """
+        Turn waypoints joined by straight runs or vias into a cell-by-cell
+        path, cutting out any loop where the path revisits a cell.
+        """
+        path = [waypoints[0]]
+        for layer, x, y in waypoints[1:]:
+            curr_layer, curr_x, curr_y = path[-1]
+            if layer != curr_layer:
+                path.append((layer, x, y))
+                continue
+            step_x = (x > curr_x) - (x < curr_x)
+            step_y = (y > curr_y) - (y < curr_y)
+            while (curr_x, curr_y) != (x, y):
+                curr_x += step_x
+                curr_y += step_y
+                path.append((layer, curr_x, curr_y))
+
+        looped = []
+        seen = {}
+        for cell in path:
+            if cell in seen:
+                del looped[seen[cell] + 1:]
+                seen = {kept: i for i, kept in enumerate(looped)}
+                continue
+            seen[cell] = len(looped)
+            looped.append(cell)
+        return looped
+
+    def _path_cost(self, path: List[Tuple[int, int, int]], end_layer: int, end_x: int, end_y: int) -> float:
+        """Cost of a path under the same move costs as the search engines."""
+        cost = 0
+        for (layer, _, _), (next_layer, x, y) in zip(path, path[1:]):
+            if layer == next_layer:
+                cost += 1
+            elif (x == end_x or y == end_y) and next_layer == end_layer:
+                cost += self.via_penalty
+            else:
+                cost += self.via_penalty + self.bend_penalty
+        return float(cost)
+
+    def _heuristic(self, layer: int, x: int, y: int, end_layer: int, end_x: int, end_y: int) -> int:
+        """
+        Lower bound on the cost from (layer, x, y) to the target. Every
+        x step has to be taken on M0 and every y step on M1, so on top of the
+        Manhattan distance we need one via to reach the other layer, or two
+        vias (the first one also paying the bend penalty) when the current
+        layer is the target layer but cannot make the remaining moves itself.
+        """
+        dx = abs(x - end_x)
+        dy = abs(y - end_y)
+        if layer != end_layer:
+            return dx + dy + self.via_penalty
+        if (layer == 0 and dy) or (layer == 1 and dx):
+            return dx + dy + 2 * self.via_penalty + self.bend_penalty
+        return dx + dy
+
+    def _search_buffers(self, direction: int) -> SearchBuffers:
+        while len(self._buffers) <= direction:
+            self._buffers.append(SearchBuffers(2 * self.height * self.width))
+        return self._buffers[direction]
+
+    def _flat_moves(self, curr: int, end_layer: int, end_x: int, end_y: int) -> List[Tuple[int, int]]:
+        """
+        Legal moves out of flat cell `curr` as (next_cell, move_cost) pairs:
+        along x on M0, along y on M1, plus the via to the other layer.
+        """
+        width = self.width
+        plane = self.height * width
+        curr_layer, rem = divmod(curr, plane)
+        curr_y, curr_x = divmod(rem, width)
+
+        x_min, x_max, y_min, y_max = self._window
+
+        moves = []
+        if curr_layer == 0:
+            if curr_x < x_max:
+                moves.append((curr + 1, 1))
+            if curr_x > x_min:
+                moves.append((curr - 1, 1))
+            via, via_layer = curr + plane, 1
+        else:
+            if curr_y < y_max:
+                moves.append((curr + width, 1))
+            if curr_y > y_min:
+                moves.append((curr - width, 1))
+            via, via_layer = curr - plane, 0
+
+        via_cost = self.via_penalty
+        if not (curr_x == end_x or curr_y == end_y) or via_layer != end_layer:
+            via_cost += self.bend_penalty
+        moves.append((via, via_cost))
+        return moves
+
+    def _flat_moves_reversed(self, curr: int, end_layer: int, end_x: int, end_y: int) -> List[Tuple[int, int]]:
+        """
+        Moves that lead into flat cell `curr`, as (previous_cell, move_cost)
+        pairs. Planar moves are symmetric; a via into `curr` is charged the
+        bend penalty by the layer it lands on, which is `curr`'s layer.
+        """
+        width = self.width
+        plane = self.height * width
+        curr_layer, rem = divmod(curr, plane)
+        curr_y, curr_x = divmod(rem, width)
+
+        x_min, x_max, y_min, y_max = self._window
+
+        moves = []
+        if curr_layer == 0:
+            if curr_x < x_max:
+                moves.append((curr + 1, 1))
+            if curr_x > x_min:
+                moves.append((curr - 1, 1))
+            via = curr + plane
+        else:
+            if curr_y < y_max:
+                moves.append((curr + width, 1))
+            if curr_y > y_min:
+                moves.append((curr - width, 1))
+            via = curr - plane
+
+        via_cost = self.via_penalty
+        if not (curr_x == end_x or curr_y == end_y) or curr_layer != end_layer:
+            via_cost += self.bend_penalty
+        moves.append((via, via_cost))
+        return moves
+
+    def _trace_flat(self, came_from: np.ndarray, end: int) -> List[Tuple[int, int, int]]:
+        """Follow predecessors back from `end` to the cell the search started from."""
+        width = self.width
+        plane = self.height * width
+        path = []
+        curr = end
+        while curr >= 0:
+            curr_layer, rem = divmod(curr, plane)
+            path.append((curr_layer, rem % width, rem // width))
+            curr = int(came_from[curr])
+        return path[::-1]
 
     def save_routing(self, output_file: str):
         with open(output_file, 'w') as f:
@@ -118,19 +1791,200 @@ class LeeRouter:
                 f.write(f"{net_name} Cost: {cost:.2f} Path: {path_str}\n")
 
 
+def net_priority(net: Tuple[str, List[Tuple[int, int, int]]]) -> Tuple[int, int]:
+    """
+    Routing order key, as in the enhanced router: fewer pins first, then
+    shorter Manhattan length through the pins in order.
+    """
+    net_name, pins = net
+    total_distance = sum(abs(x1 - x2) + abs(y1 - y2) for (_, x1, y1), (_, x2, y2) in zip(pins[:-1], pins[1:]))
+    return (len(pins), int(total_distance))
+
+
+def _windows_overlap(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> bool:
+    return a[0] <= b[1] and b[0] <= a[1] and a[2] <= b[3] and b[2] <= a[3]
+
+
+# The SharedGrid a route_nets worker process attached to, if any
+_worker_grid: Optional[SharedGrid] = None
+
+
+def _attach_worker_grid(spec):
+    global _worker_grid
+    _worker_grid = SharedGrid.attach(spec)
+
+
+def _window_blocked(blocked: np.ndarray, height: int, width: int, window: Tuple[int, int, int, int]) -> np.ndarray:
+    x_min, x_max, y_min, y_max = window
+    return blocked.reshape(2, height, width)[:, y_min:y_max + 1, x_min:x_max + 1].copy()
+
+
+def _route_window_task(task):
+    """
+    Worker side of LeeRouter.route_nets: route one net on a window-sized
+    router whose obstacles are the window's blocked cells. Returns None
+    when there is no path inside the window.
+    """
+    net_name, pins, window, enterable, blocked, bend_penalty, via_penalty, engine, multi_pin = task
+    if blocked is None:
+        blocked = _window_blocked(_worker_grid.blocked, _worker_grid.height, _worker_grid.width, window)
+    for layer, x, y in enterable:
+        blocked[layer, y, x] = False
+    router = LeeRouter(blocked.shape[1], blocked.shape[2], bend_penalty, via_penalty, engine=engine, multi_pin=multi_pin)
+    layer, y, x = np.nonzero(blocked)
+    router.add_obstacles(np.stack((layer, x, y), axis=1))
+    try:
+        path, cost = router.route_net(net_name, pins)
+    except ValueError:
+        return None
+    return path, cost, router.net_stats[net_name], router.nodes_expanded, router.line_probe_fallbacks
+
+
+def _route_tile_task(task):
+    """
+    Worker side of LeeRouter.route_tiled: route a tile's nets in order on a
+    tile-sized router that holds the tile's obstacles and routed wires.
+    Returns the tile, {net_name: (path, cost, stats) or error}, the time
+    spent and the cells expanded.
+    """
+    tile, window, nets, obstacles, wires, reserved, bend_penalty, via_penalty, engine, multi_pin, window_margin = task
+    start_time = time.perf_counter()
+    if obstacles is None:
+        x_min, x_max, y_min, y_max = window
+        obstacles = _worker_grid.grid[:, y_min:y_max + 1, x_min:x_max + 1] == -1
+    router = LeeRouter(obstacles.shape[1], obstacles.shape[2], bend_penalty, via_penalty, engine=engine,
+                       multi_pin=multi_pin)
+    layer, y, x = np.nonzero(obstacles)
+    router.add_obstacles(np.stack((layer, x, y), axis=1))
+    # Wires routed before stay with their nets, so shared pins work as in route_net
+    for net_name, (cells, pins) in wires.items():
+        router.net_ids[net_name] = len(router.net_ids) + 1
+        router._net_names[router.net_ids[net_name]] = net_name
+        router._restore_net(net_name, (cells, 0.0), {}, (pins, None))
+    # Pins reserved on the full grid, for the tile's nets and the ones
+    # stitched later, stay off limits to the other nets here too
+    router.reserve_pins(reserved)
+
+    routed = {}
+    for net_name, pins in nets:
+        try:
+            path, cost = router.route_net(net_name, pins, window_margin)
+            routed[net_name] = (path, cost, router.net_stats[net_name])
+        except ValueError as e:
+            routed[net_name] = str(e)
+    return tile, routed, time.perf_counter() - start_time, router.nodes_expanded
+
+
+def compare_engines(input_file: str, engines: Tuple[str, ...] = ("lee", "dijkstra", "astar", "hadlock")) -> Dict[str, Dict[str, float]]:
+    """
+    Route every net of input_file once per engine and print the expanded
+    cell count and total cost of each engine side by side.
+    """
+    N, M, bend_penalty, via_penalty, obstacles, nets = parse_input_file(input_file)
+    report = {}
+    for engine in engines:
+        router = LeeRouter(N, M, bend_penalty, via_penalty, engine=engine)
+        router.add_obstacles(obstacles)
+        failed = 0
+        for netName, netPoints in nets.items():
+            try:
+                router.route_net(netName, netPoints)
+            except ValueError:
+                failed += 1
+        report[engine] = {
+            "expanded": router.nodes_expanded,
+            "cost": sum(cost for _, cost in router.routed_nets.values()),
+            "failed": failed,
+        }
+
+    print(f"{'engine':<12}{'expanded':>12}{'total cost':>14}{'failed':>8}")
+    for engine, row in report.items():
+        print(f"{engine:<12}{row['expanded']:>12}{row['cost']:>14.2f}{row['failed']:>8}")
+    return report
+
+
+def compare_segments(input_file: str, engine: str = "bidirectional", baseline: str = "dijkstra") -> List[Tuple[str, int, int, int]]:
+    """
+    Route input_file with baseline and engine and print, per pin-to-pin
+    segment, how many cells each expanded and the saving of engine over
+    baseline.
+    """
+    N, M, bend_penalty, via_penalty, obstacles, nets = parse_input_file(input_file)
+    routers = []
+    for name in (baseline, engine):
+        router = LeeRouter(N, M, bend_penalty, via_penalty, engine=name)
+        router.add_obstacles(obstacles)
+        for netName, netPoints in nets.items():
+            try:
+                router.route_net(netName, netPoints)
+            except ValueError:
+                pass
+        routers.append(router)
+
+    rows = []
+    print(f"{'net':<10}{'segment':>8}{baseline:>14}{engine:>14}{'saving':>9}")
+    for netName in nets:
+        if netName not in routers[0].net_stats or netName not in routers[1].net_stats:
+            continue
+        segments = zip(routers[0].net_stats[netName]["segment_expanded"], routers[1].net_stats[netName]["segment_expanded"])
+        for i, (base_expanded, expanded) in enumerate(segments):
+            saving = 1 - expanded / base_expanded if base_expanded else 0.0
+            print(f"{netName:<10}{i:>8}{base_expanded:>14}{expanded:>14}{saving:>9.1%}")
+            rows.append((netName, i, base_expanded, expanded))
+    return rows
+
+
+def compare_global_routing(input_file: str, gcell_size: int, engine: str = "astar",
+                           corridor_margin: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    Route input_file flat (route_nets) and with route_global, both in
+    net_priority order, and print time, expanded cells, total cost,
+    failures and corridor misses side by side with the speedup.
+    """
+    N, M, bend_penalty, via_penalty, obstacles, nets = parse_input_file(input_file)
+    report = {}
+    for mode in ("flat", "global"):
+        router = LeeRouter(N, M, bend_penalty, via_penalty, engine=engine)
+        router.add_obstacles(obstacles)
+        start_time = time.perf_counter()
+        if mode == "flat":
+            failures = router.route_nets(nets)
+        else:
+            failures = router.route_global(nets, gcell_size, corridor_margin)
+        report[mode] = {
+            "time": time.perf_counter() - start_time,
+            "expanded": router.nodes_expanded,
+            "cost": sum(cost for _, cost in router.routed_nets.values()),
+            "failed": len(failures),
+            "misses": router.corridor_misses,
+        }
+
+    print(f"{'mode':<8}{'time (s)':>10}{'expanded':>12}{'total cost':>14}{'failed':>8}{'misses':>8}")
+    for mode, row in report.items():
+        print(f"{mode:<8}{row['time']:>10.3f}{row['expanded']:>12}{row['cost']:>14.2f}{row['failed']:>8}{row['misses']:>8}")
+    if report["global"]["time"]:
+        print(f"Speedup: {report['flat']['time'] / report['global']['time']:.2f}x")
+    return report
+
+
 def main():
     while True:
         inputFileName = input("Enter the name of the file, or X to leave: ")
         if (inputFileName == "X" or inputFileName == "x"):
             break
         print("\n")
+        engine = input(f"Enter the search engine {LeeRouter.ENGINES}, or press Enter for lee: ").strip() or "lee"
         N, M, bend_penalty, via_penalty, obstacles, nets = parse_input_file(inputFileName)
-        router = LeeRouter(N, M, bend_penalty, via_penalty)
-        for obstacle in obstacles:
-            router.add_obstacle(obstacle[0], obstacle[1], obstacle[2])
+        router = LeeRouter(N, M, bend_penalty, via_penalty, engine=engine)
+        router.add_obstacles(obstacles)
+        router.reserve_pins(nets)
         for netName, netPoints in nets.items():
             print("POTATOOO", netName, netPoints)
-            router.route_net(netName, netPoints)
+            try:
+                router.route_net(netName, netPoints)
+            except ValueError as e:
+                print(f"Failed to route {netName}: {e}")
+                router._release_reservations(netName, router._adjust_pins(netPoints))
         outputFileName = input("Enter the name of file to save the output: ")
         print("\n")
         router.save_routing(outputFileName)
@@ -14,8 +14,15 @@ import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 import colorsys
 import matplotlib.colors as mcolors
+from bucket_queue import BucketQueue
+from negotiated_congestion import route_negotiated, routing_summary
+from net_ordering import route_in_order, search_net_orders
 
 class LeeRouter:
+    # Routing density moves in steps of 0.1, so step costs are kept in
+    # tenths, as integers, whenever they fall on that grid
+    COST_SCALE = 10
+
     def __init__(self, width: int, height: int, bend_penalty: int, via_penalty: int):
         self.width = width
         self.height = height
@@ -33,6 +40,10 @@ class LeeRouter:
         self.routed_nets: Dict[str, Tuple[List[Tuple[int, int, int]], float]] = {}
         self.obstacles: List[Tuple[int, int, int]] = []
         self.net_colors = {}
+        # Per-iteration stats of the last route_nets_negotiated call
+        self.negotiation_stats: List[Dict[str, float]] = []
+        # Per-candidate results of the last search_net_order call
+        self.ordering_stats: List[Dict[str, object]] = []
 
     def add_obstacle(self, layer: int, x: int, y: int):
         if 0 <= layer < 2 and 0 <= x < self.width and 0 <= y < self.height:
@@ -51,6 +62,49 @@ class LeeRouter:
                 # Increment/decrement with a small value
                 self.routing_density[layer][y, x] += multiplier * 0.1
 
+    def _step_costs(self) -> Tuple[List[np.ndarray], int]:
+        """
+        Per-cell cost of stepping onto each cell of each layer, 1 + routing
+        density, and the scale the costs (and bend/via penalties) are in.
+        Densities on the 0.1 grid with whole, non-negative penalties give
+        integer costs in tenths; other densities (e.g. the ones negotiated
+        congestion writes) are returned as they are, with scale 1.
+        """
+        costs = [1 + density for density in self.routing_density]
+        scaled = [cost * self.COST_SCALE for cost in costs]
+        rounded = [np.rint(cost) for cost in scaled]
+        penalties_fit = all(float(penalty).is_integer() and penalty >= 0
+                            for penalty in (self.bend_penalty, self.via_penalty))
+        if penalties_fit and all(np.isclose(rounded[layer], scaled[layer], rtol=0, atol=1e-6).all()
+                                 for layer in range(2)):
+            return rounded, self.COST_SCALE
+        return costs, 1
+
+    def route_nets_negotiated(self, nets: List[Tuple[str, List[Tuple[int, int, int]]]],
+                              **kwargs) -> Tuple[Dict[str, Tuple[List[Tuple[int, int, int]], float]], Dict[str, str]]:
+        """
+        Route the nets with negotiated congestion (rip-up and reroute of the
+        nets on overused cells, see negotiated_congestion.route_negotiated).
+        Returns the kept routes and {net_name: error} for the nets left
+        unrouted. Per-iteration overflow, rerouted and failed nets and wall
+        time are kept in negotiation_stats.
+        """
+        routed, failures, self.negotiation_stats = route_negotiated(self, nets, **kwargs)
+        return routed, failures
+
+    def search_net_order(self, nets: List[Tuple[str, List[Tuple[int, int, int]]]],
+                         **kwargs) -> List[Tuple[str, List[Tuple[int, int, int]]]]:
+        """
+        Try many net orders on copies of this (unrouted) router, in parallel
+        when max_workers > 1, and route the best one here (see
+        net_ordering.search_net_orders for the candidates, time_budget,
+        objective and seed). Per-candidate results are kept in
+        ordering_stats. Returns the best order.
+        """
+        order, self.ordering_stats = search_net_orders(self, nets, net_priority, **kwargs)
+        route_in_order(self, order)
+        return order
+
     def route_net(self, net_name: str, pins: List[Tuple[int, int, int]],
                   existing_routes: List[List[Tuple[int, int, int]]] = None) -> Tuple[List[Tuple[int, int, int]], float]:
         if len(pins) < 2:
@@ -65,6 +119,10 @@ class LeeRouter:
         adjusted_pins = [(max(0, min(layer, 1)), max(0, min(x, self.width - 1)), max(0, min(y, self.height - 1)))
                          for layer, x, y in pins]
 
+        # Congestion only changes when a net is committed, so the per-cell
+        # step costs are computed once for the whole net
+        step_costs, cost_scale = self._step_costs()
+
         full_path = []
         total_cost = 0
 
@@ -77,6 +135,8 @@ class LeeRouter:
                 start_layer, start_x, start_y,
                 end_layer, end_x, end_y,
                 existing_routes or [],
+                step_costs,
+                cost_scale,
                 congestion_penalty
             )
 
@@ -95,6 +155,8 @@ class LeeRouter:
     def _lee_route_with_congestion(self, start_layer: int, start_x: int, start_y: int,
                                    end_layer: int, end_x: int, end_y: int,
                                    existing_routes: List[List[Tuple[int, int, int]]],
+                                   step_costs: List[np.ndarray],
+                                   cost_scale: int,
                                    congestion_penalty: float) -> Tuple[List[Tuple[int, int, int]], float]:
         directions = [
             (1, 0, 0), (-1, 0, 0),  # X directions
@@ -102,8 +164,22 @@ class LeeRouter:
             (0, 0, 1), (0, 0, -1)    # Layer directions
         ]
 
-        # Priority Queue for routing with congestion awareness
-        queue = PriorityQueue()
+        # Costs in tenths (cost_scale > 1) are integers, so a bucket queue
+        # (Dial's algorithm) keyed by the path cost orders the search.
+        # Otherwise the heap is keyed by new_cost * congestion_penalty, a
+        # positive constant for the whole net. Either way a popped state has
+        # the least path cost, but equal-cost states come out in a different
+        # order (FIFO buckets vs tuple comparison), so ties may be broken
+        # differently.
+        bend_cost = self.bend_penalty * cost_scale
+        via_cost = self.via_penalty * cost_scale
+        use_buckets = cost_scale > 1
+        if use_buckets:
+            max_step = max(float(np.max(c[np.isfinite(c)], initial=0)) for c in step_costs)
+            queue = BucketQueue(max_step + bend_cost + via_cost)
+        else:
+            # Priority Queue for routing with congestion awareness
+            queue = PriorityQueue()
 
         # Initialize wave grid with high values
         wave_grid = [np.full((self.height, self.width), float('inf')) for _ in range(2)]
@@ -118,6 +194,10 @@ class LeeRouter:
         while not queue.empty():
             current_priority, curr_layer, curr_x, curr_y = queue.get()
 
+            # Skip entries superseded by a cheaper push of the same cell
+            if use_buckets and current_priority > wave_grid[curr_layer][curr_y, curr_x]:
+                continue
+
             if (curr_layer, curr_x, curr_y) == (end_layer, end_x, end_y):
                 break
 
@@ -139,22 +219,18 @@ class LeeRouter:
                 if curr_layer == 1 and dx != 0:  # M1 is for vertical
                     continue
 
-                # Calculate move cost
-                move_cost = 1
-
-                # Add congestion penalty from routing density
-                congestion_factor = 1 + self.routing_density[new_layer][new_y, new_x]
-                move_cost *= congestion_factor
+                # Move cost, raised by the congestion from routing density
+                move_cost = step_costs[new_layer][new_y, new_x]
 
                 # Calculate bend penalty
                 current_direction = (dx, dy, dlayer)
                 last_dir = last_direction.get((curr_layer, curr_x, curr_y))
                 if last_dir and last_dir != current_direction:
-                    move_cost += self.bend_penalty
+                    move_cost += bend_cost
 
                 # Via penalty
                 if curr_layer != new_layer:
-                    move_cost += self.via_penalty
+                    move_cost += via_cost
 
                 # Total cost
                 new_cost = wave_grid[curr_layer][curr_y, curr_x] + move_cost
@@ -164,7 +240,7 @@ class LeeRouter:
                     wave_grid[new_layer][new_y, new_x] = new_cost
 
                     # Priority is the total cost
-                    priority = new_cost * congestion_penalty
+                    priority = int(new_cost) if use_buckets else new_cost * congestion_penalty
                     queue.put((priority, new_layer, new_x, new_y))
 
                     came_from[(new_layer, new_x, new_y)] = (curr_layer, curr_x, curr_y)
@@ -182,7 +258,7 @@ class LeeRouter:
             curr_pos = came_from[curr_pos]
         path.append((start_layer, start_x, start_y))
 
-        return path[::-1], wave_grid[end_layer][end_y, end_x]
+        return path[::-1], wave_grid[end_layer][end_y, end_x] / cost_scale
 
     def save_routing(self, output_file: str):
         with open(output_file, 'w') as f:
@@ -525,11 +601,61 @@ def main():
     router_with_priority.save_routing("routing_output_with_priority.txt")
     router_with_priority.visualize_routing()
 
+    # Third run with negotiated congestion: nets on shared cells are ripped up and rerouted
+    print("\n--- THIRD RUN: NEGOTIATED CONGESTION ---")
+    router_negotiated = LeeRouter(16, 16, bend_penalty, via_penalty)
+
+    for layer, x, y in obstacles:
+        router_negotiated.add_obstacle(layer, x, y)
+
+    routed_negotiated, failed_negotiated = router_negotiated.route_nets_negotiated(nets_with_priority)
+    for stats in router_negotiated.negotiation_stats:
+        print(f"Iteration {stats['iteration']}: overflow {stats['overflow']}, "
+              f"rerouted {stats['rerouted']} nets in {stats['time']:.3f}s")
+    for net_name, (path, cost) in routed_negotiated.items():
+        print(f"{net_name} routing cost: {cost:.2f}")
+    for net_name, error in failed_negotiated.items():
+        print(f"Failed to route {net_name}: {error}")
+
+    router_negotiated.save_routing("routing_output_negotiated.txt")
+    router_negotiated.visualize_routing()
+
+    # Fourth run: search many net orders and keep the cheapest routing
+    print("\n--- FOURTH RUN: NET ORDER SEARCH ---")
+    router_searched = LeeRouter(16, 16, bend_penalty, via_penalty)
+
+    for layer, x, y in obstacles:
+        router_searched.add_obstacle(layer, x, y)
+
+    best_order = router_searched.search_net_order(nets_without_priority, time_budget=5.0, seed=0)
+    best_names = [net_name for net_name, _ in best_order]
+    best = next(stats for stats in router_searched.ordering_stats if stats["order"] == best_names)
+    print(f"Tried {len(router_searched.ordering_stats)} orders, best is {best['candidate']}: "
+          f"{' '.join(best_names)}")
+    total_cost_searched = 0
+    for net_name, (path, cost) in router_searched.routed_nets.items():
+        total_cost_searched += cost
+        print(f"{net_name} routing cost: {cost:.2f}")
+
+    router_searched.save_routing("routing_output_searched.txt")
+    router_searched.visualize_routing()
+
     # Compare total routing costs
     print("\n--- ROUTING COST COMPARISON ---")
     print(f"Total routing cost without priority: {total_cost_without_priority:.2f}")
     print(f"Total routing cost with priority: {total_cost_with_priority:.2f}")
     print(f"Cost difference: {abs(total_cost_without_priority - total_cost_with_priority):.2f}")
+    print(f"Total routing cost with the best net order: {total_cost_searched:.2f}")
+
+    # Negotiated costs come from their own densities, so all runs are also
+    # compared by the wires they leave
+    for label, router in (("without priority", router_without_priority),
+                          ("with priority", router_with_priority),
+                          ("with negotiated congestion", router_negotiated),
+                          ("with the best net order", router_searched)):
+        summary = routing_summary(router, nets_without_priority)
+        print(f"Wirelength, vias and overflow {label}: "
+              f"{summary['wirelength']}, {summary['vias']}, {summary['overflow']}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -14,6 +14,8 @@ import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 import colorsys
 import matplotlib.colors as mcolors
+from negotiated_congestion import route_negotiated, routing_summary
+from net_ordering import route_in_order, search_net_orders
 
 class LeeRouter:
     def __init__(self, width: int, height: int, bend_penalty: int, via_penalty: int):
@@ -30,9 +32,19 @@ class LeeRouter:
             np.zeros((height, width), dtype=float),
             np.zeros((height, width), dtype=float)
         ]
+        # How many times the committed routes pass each cell, kept up to date
+        # on commit and rip-up instead of being rebuilt for every segment
+        self.route_density = [
+            np.zeros((height, width), dtype=float),
+            np.zeros((height, width), dtype=float)
+        ]
         self.routed_nets: Dict[str, Tuple[List[Tuple[int, int, int]], float]] = {}
         self.obstacles: List[Tuple[int, int, int]] = []
         self.net_colors = {}
+        # Per-iteration stats of the last route_nets_negotiated call
+        self.negotiation_stats: List[Dict[str, float]] = []
+        # Per-candidate results of the last search_net_order call
+        self.ordering_stats: List[Dict[str, object]] = []
 
     def add_obstacle(self, layer: int, x: int, y: int):
         if 0 <= layer < 2 and 0 <= x < self.width and 0 <= y < self.height:
@@ -46,10 +58,56 @@ class LeeRouter:
         If increment is True, increase density; if False, decrease density
         """
         multiplier = 1 if increment else -1
-        for layer, x, y in path:
-            if 0 <= layer < 2 and 0 <= x < self.width and 0 <= y < self.height:
-                # Increment/decrement with a small value
-                self.routing_density[layer][y, x] += multiplier * 0.1
+        cells = np.array(path, dtype=int).reshape(-1, 3)
+        for layer in range(2):
+            on_layer = cells[(cells[:, 0] == layer) &
+                             (cells[:, 1] >= 0) & (cells[:, 1] < self.width) &
+                             (cells[:, 2] >= 0) & (cells[:, 2] < self.height)]
+            # Increment/decrement with a small value, once per visit
+            np.add.at(self.routing_density[layer], (on_layer[:, 2], on_layer[:, 1]), multiplier * 0.1)
+            np.add.at(self.route_density[layer], (on_layer[:, 2], on_layer[:, 1]), multiplier)
+
+    def remove_net(self, net_name: str):
+        """Rip up a routed net, taking its path back out of both density maps."""
+        if net_name not in self.routed_nets:
+            raise ValueError(f"Net {net_name} is not routed")
+        path, _ = self.routed_nets.pop(net_name)
+        self._calculate_routing_congestion(path, increment=False)
+
+    def _step_costs(self, net_complexity: float) -> List[np.ndarray]:
+        """Per-cell cost of stepping onto each cell of each layer for a net of this complexity."""
+        base_cost = 1 + net_complexity * 0.5
+        return [
+            base_cost * (1 +
+                         self.routing_density[layer] * (2 + net_complexity) +
+                         self.route_density[layer] * (3 + net_complexity))
+            for layer in range(2)
+        ]
+
+    def route_nets_negotiated(self, nets: List[Tuple[str, List[Tuple[int, int, int]]]],
+                              **kwargs) -> Tuple[Dict[str, Tuple[List[Tuple[int, int, int]], float]], Dict[str, str]]:
+        """
+        Route the nets with negotiated congestion (rip-up and reroute of the
+        nets on overused cells, see negotiated_congestion.route_negotiated).
+        Returns the kept routes and {net_name: error} for the nets left
+        unrouted. Per-iteration overflow, rerouted and failed nets and wall
+        time are kept in negotiation_stats.
+        """
+        routed, failures, self.negotiation_stats = route_negotiated(self, nets, **kwargs)
+        return routed, failures
+
+    def search_net_order(self, nets: List[Tuple[str, List[Tuple[int, int, int]]]],
+                         **kwargs) -> List[Tuple[str, List[Tuple[int, int, int]]]]:
+        """
+        Try many net orders on copies of this (unrouted) router, in parallel
+        when max_workers > 1, and route the best one here (see
+        net_ordering.search_net_orders for the candidates, time_budget,
+        objective and seed). Per-candidate results are kept in
+        ordering_stats. Returns the best order.
+        """
+        order, self.ordering_stats = search_net_orders(self, nets, net_priority, **kwargs)
+        route_in_order(self, order)
+        return order
 
     def route_net(self, net_name: str, pins: List[Tuple[int, int, int]],
                   existing_routes: List[List[Tuple[int, int, int]]] = None,
@@ -88,27 +146,43 @@ class LeeRouter:
         adjusted_pins = [(max(0, min(layer, 1)), max(0, min(x, self.width - 1)), max(0, min(y, self.height - 1)))
                         for layer, x, y in pins]
 
+        # Routing a net again replaces its earlier route, which is put back
+        # if no new one is found
+        previous = self.routed_nets.get(net_name)
+        if previous is not None:
+            self.remove_net(net_name)
+
+        # Congestion only changes when a net is committed, so the per-cell
+        # step costs are computed once for the whole net
+        step_costs = self._step_costs(net_complexity)
+
         full_path = []
         total_cost = 0
 
-        for i in range(len(adjusted_pins) - 1):
-            start_layer, start_x, start_y = adjusted_pins[i]
-            end_layer, end_x, end_y = adjusted_pins[i + 1]
-
-            # Pass net complexity to the routing algorithm
-            path, cost = self._lee_route_with_dynamic_congestion(
-                start_layer, start_x, start_y,
-                end_layer, end_x, end_y,
-                existing_routes or [],
-                congestion_penalty,
-                net_complexity
-            )
-
-            if not full_path:
-                full_path.extend(path)
-            else:
-                full_path.extend(path[1:])
-            total_cost += cost * congestion_penalty
+        try:
+            for i in range(len(adjusted_pins) - 1):
+                start_layer, start_x, start_y = adjusted_pins[i]
+                end_layer, end_x, end_y = adjusted_pins[i + 1]
+
+                # Pass net complexity to the routing algorithm
+                path, cost = self._lee_route_with_dynamic_congestion(
+                    start_layer, start_x, start_y,
+                    end_layer, end_x, end_y,
+                    step_costs,
+                    congestion_penalty,
+                    net_complexity
+                )
+
+                if not full_path:
+                    full_path.extend(path)
+                else:
+                    full_path.extend(path[1:])
+                total_cost += cost * congestion_penalty
+        except ValueError:
+            if previous is not None:
+                self.routed_nets[net_name] = previous
+                self._calculate_routing_congestion(previous[0])
+            raise
 
         # Update routing density
         self._calculate_routing_congestion(full_path)
@@ -118,7 +192,7 @@ class LeeRouter:
 
     def _lee_route_with_dynamic_congestion(self, start_layer: int, start_x: int, start_y: int,
                                           end_layer: int, end_x: int, end_y: int,
-                                          existing_routes: List[List[Tuple[int, int, int]]],
+                                          step_costs: List[np.ndarray],
                                           congestion_penalty: float,
                                           net_complexity: float = 1.0) -> Tuple[List[Tuple[int, int, int]], float]:
         directions = [
@@ -127,6 +201,9 @@ class LeeRouter:
             (0, 0, 1), (0, 0, -1)    # Layer directions
         ]
 
+        bend_cost = max(self.bend_penalty * (1 - net_complexity * 0.2), 1)
+        via_cost = max(self.via_penalty * (1 - net_complexity * 0.3), 1)
+
         # Expanded Priority Queue for more nuanced routing
         queue = PriorityQueue()
 
@@ -140,12 +217,6 @@ class LeeRouter:
         came_from = {}
         last_direction = {}
 
-        # Track existing route densities
-        existing_route_density = [np.zeros((self.height, self.width), dtype=float) for _ in range(2)]
-        for route in existing_routes:
-            for layer, x, y in route:
-                existing_route_density[layer][y, x] += 1
-
         while not queue.empty():
             current_priority, curr_layer, curr_x, curr_y = queue.get()
 
@@ -170,32 +241,21 @@ class LeeRouter:
                 if curr_layer == 1 and dx != 0:  # M1 is for vertical
                     continue
 
-                # Calculate base move cost
-                move_cost = 1
-
-                # Adjust move cost based on net complexity
-                # More complex nets get more routing flexibility
-                move_cost *= (1 + net_complexity * 0.5)
-
-                # Add congestion penalty from routing density and existing routes
-                # Use net complexity to further modulate congestion impact
-                congestion_factor = (
-                    1 +
-                    self.routing_density[new_layer][new_y, new_x] * (2 + net_complexity) +
-                    existing_route_density[new_layer][new_y, new_x] * (3 + net_complexity)
-                )
-                move_cost *= congestion_factor
+                # Base move cost scaled by net complexity (more complex nets
+                # get more routing flexibility) and by the congestion from
+                # routing density and committed routes, precomputed per cell
+                move_cost = step_costs[new_layer][new_y, new_x]
 
                 # Calculate bend penalty
                 current_direction = (dx, dy, dlayer)
                 last_dir = last_direction.get((curr_layer, curr_x, curr_y))
                 if last_dir and last_dir != current_direction:
                     # Reduce bend penalty for more complex nets
-                    move_cost += max(self.bend_penalty * (1 - net_complexity * 0.2), 1)
+                    move_cost += bend_cost
 
                 # Via penalty with complexity consideration
                 if curr_layer != new_layer:
-                    move_cost += max(self.via_penalty * (1 - net_complexity * 0.3), 1)
+                    move_cost += via_cost
 
                 # Total cost
                 new_cost = wave_grid[curr_layer][curr_y, curr_x] + move_cost
@@ -573,11 +633,61 @@ def main():
     router_with_priority.save_routing("routing_output_with_priority.txt")
     router_with_priority.visualize_routing()
 
+    # Third run with negotiated congestion: nets on shared cells are ripped up and rerouted
+    print("\n--- THIRD RUN: NEGOTIATED CONGESTION ---")
+    router_negotiated = LeeRouter(16, 16, bend_penalty, via_penalty)
+
+    for layer, x, y in obstacles:
+        router_negotiated.add_obstacle(layer, x, y)
+
+    routed_negotiated, failed_negotiated = router_negotiated.route_nets_negotiated(nets_with_priority)
+    for stats in router_negotiated.negotiation_stats:
+        print(f"Iteration {stats['iteration']}: overflow {stats['overflow']}, "
+              f"rerouted {stats['rerouted']} nets in {stats['time']:.3f}s")
+    for net_name, (path, cost) in routed_negotiated.items():
+        print(f"{net_name} routing cost: {cost:.2f}")
+    for net_name, error in failed_negotiated.items():
+        print(f"Failed to route {net_name}: {error}")
+
+    router_negotiated.save_routing("routing_output_negotiated.txt")
+    router_negotiated.visualize_routing()
+
+    # Fourth run: search many net orders and keep the cheapest routing
+    print("\n--- FOURTH RUN: NET ORDER SEARCH ---")
+    router_searched = LeeRouter(16, 16, bend_penalty, via_penalty)
+
+    for layer, x, y in obstacles:
+        router_searched.add_obstacle(layer, x, y)
+
+    best_order = router_searched.search_net_order(nets_without_priority, time_budget=5.0, seed=0)
+    best_names = [net_name for net_name, _ in best_order]
+    best = next(stats for stats in router_searched.ordering_stats if stats["order"] == best_names)
+    print(f"Tried {len(router_searched.ordering_stats)} orders, best is {best['candidate']}: "
+          f"{' '.join(best_names)}")
+    total_cost_searched = 0
+    for net_name, (path, cost) in router_searched.routed_nets.items():
+        total_cost_searched += cost
+        print(f"{net_name} routing cost: {cost:.2f}")
+
+    router_searched.save_routing("routing_output_searched.txt")
+    router_searched.visualize_routing()
+
     # Compare total routing costs
     print("\n--- ROUTING COST COMPARISON ---")
     print(f"Total routing cost without priority: {total_cost_without_priority:.2f}")
     print(f"Total routing cost with priority: {total_cost_with_priority:.2f}")
     print(f"Cost difference: {abs(total_cost_without_priority - total_cost_with_priority):.2f}")
+    print(f"Total routing cost with the best net order: {total_cost_searched:.2f}")
+
+    # Negotiated costs come from their own densities, so all runs are also
+    # compared by the wires they leave
+    for label, router in (("without priority", router_without_priority),
+                          ("with priority", router_with_priority),
+                          ("with negotiated congestion", router_negotiated),
+                          ("with the best net order", router_searched)):
+        summary = routing_summary(router, nets_without_priority)
+        print(f"Wirelength, vias and overflow {label}: "
+              f"{summary['wirelength']}, {summary['vias']}, {summary['overflow']}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
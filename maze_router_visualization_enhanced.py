@@ -8,6 +8,7 @@ import matplotlib.colors as mcolors
 import re
 import os
 import argparse
+from connectivity import label_components
 
 class LeeRouter:
    
@@ -56,6 +57,8 @@ class LeeRouter:
         self.routed_nets: Dict[str, Tuple[List[Tuple[int, int, int]], float]] = {}
         self.obstacles: List[Tuple[int, int, int]] = []
         self.net_colors = {}  
+        # Component labels from label_components, rebuilt after obstacle changes
+        self._components = None
 
   
 
@@ -115,6 +118,31 @@ class LeeRouter:
         if 0 <= layer < 2 and 0 <= x < self.width and 0 <= y < self.height:
             self.layers[layer][y, x] = -1
             self.obstacles.append((layer, x, y))
+            self._components = None
+
+    def pin_component(self, pin: Tuple[int, int, int]) -> int:
+        """Connectivity label of a (layer, x, y) pin, -1 if it sits on an obstacle."""
+        if self._components is None:
+            self._components = label_components(self.layers)
+        layer, x, y = pin
+        layer, x, y = max(0, min(layer, 1)), max(0, min(x, self.width - 1)), max(0, min(y, self.height - 1))
+        return int(self._components[layer, y, x])
+
+    def reachable_pins(self, pins: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        """
+        Keep the pins of the connected component holding the most pins (the
+        earliest such pin's on ties), in their original order. Pins outside
+        it can never be joined to the rest, so they are dropped in one pass.
+        """
+        labels = [self.pin_component(pin) for pin in pins]
+        counts = {}
+        for label in labels:
+            if label >= 0:
+                counts[label] = counts.get(label, 0) + 1
+        if not counts:
+            return []
+        best = max(counts, key=lambda label: (counts[label], -labels.index(label)))
+        return [pin for pin, label in zip(pins, labels) if label == best]
 
     def route_all_nets(self):
         self.sort_nets_by_priority()
@@ -124,47 +152,28 @@ class LeeRouter:
         total_vias = 0
 
         for net_name, (pins, _) in self.routed_nets.items():
-            while len(pins) >= 2:
-                try:
-                    path, cost = self.route_net(net_name, pins)
-                    self.routed_nets[net_name] = (path, cost)
-
-                    wire_length = len(path) - 1
-                    vias = sum(1 for i in range(len(path) - 1) if path[i][0] != path[i + 1][0])
-                    total_wire_length += wire_length
-                    total_vias += vias
-                    longest_route = max(longest_route, wire_length)
-
-                    print(f"{net_name} routed with cost: {cost:.2f}")
-                    break  # Exit the while loop if routing is successful
-                except ValueError as e:
-                    print(f"Failed to route {net_name}: {e}")
-                    if len(pins) > 2:
-                        print(f"Removing first pin and retrying for net {net_name}")
-                        first_pin = pins.pop(0)  # Remove the first pin and try again
-                        try:
-                            path, cost = self.route_net(net_name, pins)
-                            self.routed_nets[net_name] = (path, cost)
-
-                            wire_length = len(path) - 1
-                            vias = sum(1 for i in range(len(path) - 1) if path[i][0] != path[i + 1][0])
-                            total_wire_length += wire_length
-                            total_vias += vias
-                            longest_route = max(longest_route, wire_length)
-
-                            print(f"{net_name} routed with cost: {cost:.2f}")
-                            break  # Exit the while loop if routing is successful
-                        except ValueError as e:
-                            print(f"Failed to route {net_name} after removing first pin: {e}")
-                            pins.insert(0, first_pin)  # Return the first pin back
-                            print(f"Removing second pin and retrying for net {net_name}")
-                            pins.pop(1)  # Remove the second pin and try again
-                    else:
-                        print(f"Removing last pin and retrying for net {net_name}")
-                        pins.pop()  # Remove the last pin and try again
-                    if len(pins) < 2:
-                        print(f"Not enough pins to route net {net_name} after removing isolated pins.")
-                        break  # Exit the while loop if fewer than two pins are left
+            reachable = self.reachable_pins(pins)
+            if len(reachable) < len(pins):
+                dropped = [pin for pin in pins if pin not in reachable]
+                print(f"Removing unreachable pins {dropped} from net {net_name}")
+            if len(reachable) < 2:
+                print(f"Not enough pins to route net {net_name} after removing isolated pins.")
+                self.routed_nets[net_name] = (reachable, 0.0)
+                continue
+            try:
+                path, cost = self.route_net(net_name, reachable)
+            except ValueError as e:
+                print(f"Failed to route {net_name}: {e}")
+                continue
+            self.routed_nets[net_name] = (path, cost)
+
+            wire_length = len(path) - 1
+            vias = sum(1 for i in range(len(path) - 1) if path[i][0] != path[i + 1][0])
+            total_wire_length += wire_length
+            total_vias += vias
+            longest_route = max(longest_route, wire_length)
+
+            print(f"{net_name} routed with cost: {cost:.2f}")
 
         print("\nRouting Metrics:")
         print(f"Longest Route: {longest_route} segments")
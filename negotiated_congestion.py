@@ -0,0 +1,147 @@
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+def route_negotiated(router, nets: List[Tuple[str, List[Tuple[int, int, int]]]],
+                     max_iterations: int = 20, present_factor: float = 0.5,
+                     present_growth: float = 1.5, history_factor: float = 0.5,
+                     stall_iterations: int = 5
+                     ) -> Tuple[Dict[str, Tuple[List[Tuple[int, int, int]], float]], Dict[str, str], List[Dict[str, object]]]:
+    """
+    PathFinder-style negotiated congestion for the congestion-aware routers.
+
+    Every cell holds one net, except pins shared by several nets, which hold
+    them all. Before each net is routed, routing_density is raised above
+    its base value by (1 + history) * (1 + present_factor * other nets on
+    the cell) - 1. Each router turns the density into its own step cost:
+    the distance router's step factor is (1 + density), while the pins
+    router scales density by (2 + net complexity) and adds its committed
+    route_density, so the negotiated terms are weighted per router. After
+    an iteration, every overused cell adds history_factor per net over
+    capacity to its history, and present_factor grows by present_growth.
+    Only the nets crossing an overused cell are ripped up and rerouted. The
+    loop stops when nothing is overused, when the overflow has not improved
+    for stall_iterations iterations (some nets cannot be separated, e.g.
+    more nets leaving a pin than it has free neighbours), or after
+    max_iterations. The routing with the lowest overflow is kept.
+
+    The router needs route_net(net_name, pins), routed_nets,
+    routing_density, _calculate_routing_congestion(path), width and height.
+    Costs are those route_net reported when each kept path was routed,
+    under the negotiated densities, so they do not compare with costs from
+    plain route_net calls; routing_summary does. Afterwards routed_nets
+    holds exactly the kept paths of these nets, and routing_density (and
+    the pins router's route_density) is what committing each kept path
+    once would have left.
+
+    Returns ({net_name: (path, cost)}, {net_name: error} for the nets
+    without a kept path, per-iteration stats). Each stats entry has the
+    iteration number, the total overflow, the overused cell count, the
+    number of nets routed, the nets that failed and the wall time in
+    seconds.
+    """
+    shape = (2, router.height, router.width)
+    base_density = [density.copy() for density in router.routing_density]
+    base_route_density = [density.copy() for density in getattr(router, "route_density", [])]
+    occupancy = np.zeros(shape, dtype=int)
+    history = np.zeros(shape)
+    capacity = _capacity(router, nets)
+    net_pins = dict(nets)
+
+    routed: Dict[str, Tuple[List[Tuple[int, int, int]], float]] = {}
+    errors: Dict[str, str] = {}
+    to_route = [net_name for net_name, _ in nets]
+    stats = []
+    best_overflow, best_iteration, best_routed = None, 0, {}
+    for iteration in range(1, max_iterations + 1):
+        start_time = time.perf_counter()
+        failed = []
+        for net_name in to_route:
+            if net_name in routed:
+                _add_usage(occupancy, routed.pop(net_name)[0], -1)
+            for layer in range(2):
+                router.routing_density[layer] = (base_density[layer] - 1 +
+                                                 (1 + history[layer]) * (1 + present_factor * occupancy[layer]))
+            try:
+                path, cost = router.route_net(net_name, net_pins[net_name])
+            except ValueError as e:
+                errors[net_name] = str(e)
+                failed.append(net_name)
+                continue
+            routed[net_name] = (path, cost)
+            _add_usage(occupancy, path, 1)
+
+        overuse = np.maximum(occupancy - capacity, 0)
+        stats.append({
+            "iteration": iteration,
+            "overflow": int(overuse.sum()),
+            "overused_cells": int(np.count_nonzero(overuse)),
+            "rerouted": len(to_route),
+            "failed": failed,
+            "time": time.perf_counter() - start_time,
+        })
+        if best_overflow is None or stats[-1]["overflow"] < best_overflow:
+            best_overflow, best_iteration, best_routed = stats[-1]["overflow"], iteration, dict(routed)
+        if not overuse.any() or iteration - best_iteration >= stall_iterations:
+            break
+        history += history_factor * overuse
+        present_factor *= present_growth
+        to_route = [net_name for net_name, _ in nets
+                    if net_name in routed and any(overuse[layer, y, x] for layer, x, y in routed[net_name][0])]
+
+    for layer in range(2):
+        router.routing_density[layer] = base_density[layer].copy()
+    for layer, density in enumerate(base_route_density):
+        router.route_density[layer] = density.copy()
+    for net_name, _ in nets:
+        router.routed_nets.pop(net_name, None)
+    for net_name, (path, cost) in best_routed.items():
+        router.routed_nets[net_name] = (path, cost)
+        router._calculate_routing_congestion(path)
+    failures = {net_name: errors[net_name] for net_name, _ in nets if net_name not in best_routed}
+    return best_routed, failures, stats
+
+
+def routing_summary(router, nets: List[Tuple[str, List[Tuple[int, int, int]]]]) -> Dict[str, int]:
+    """
+    Wirelength (planar steps), vias and overflow of router.routed_nets,
+    with the capacities route_negotiated uses for these nets. Unlike the
+    reported costs, these compare across runs that routed under different
+    cost models.
+    """
+    occupancy = np.zeros((2, router.height, router.width), dtype=int)
+    wirelength = vias = 0
+    for path, _ in router.routed_nets.values():
+        _add_usage(occupancy, path, 1)
+        for (layer, _, _), (next_layer, _, _) in zip(path, path[1:]):
+            if layer == next_layer:
+                wirelength += 1
+            else:
+                vias += 1
+    overflow = int(np.maximum(occupancy - _capacity(router, nets), 0).sum())
+    return {"wirelength": wirelength, "vias": vias, "overflow": overflow}
+
+
+def _capacity(router, nets: List[Tuple[str, List[Tuple[int, int, int]]]]) -> np.ndarray:
+    """One net per cell, except pins, which hold every net that lists them."""
+    capacity = np.ones((2, router.height, router.width), dtype=int)
+    pin_owners: Dict[Tuple[int, int, int], int] = {}
+    for _, pins in nets:
+        for pin in {_clamp_pin(router, pin) for pin in pins}:
+            pin_owners[pin] = pin_owners.get(pin, 0) + 1
+    for (layer, x, y), owners in pin_owners.items():
+        capacity[layer, y, x] = owners
+    return capacity
+
+
+def _clamp_pin(router, pin: Tuple[int, int, int]) -> Tuple[int, int, int]:
+    layer, x, y = pin
+    return max(0, min(layer, 1)), max(0, min(x, router.width - 1)), max(0, min(y, router.height - 1))
+
+
+def _add_usage(occupancy: np.ndarray, path: List[Tuple[int, int, int]], amount: int):
+    """Count a net once on every cell its path touches."""
+    for layer, x, y in set(path):
+        occupancy[layer, y, x] += amount
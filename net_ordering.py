@@ -0,0 +1,186 @@
+import copy
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+Net = Tuple[str, List[Tuple[int, int, int]]]
+
+# The unrouted router a search worker process copies for every candidate
+_worker_router = None
+
+
+def route_in_order(router, order: List[Net]) -> Tuple[List[str], float]:
+    """
+    Route nets one after another as the testcase mains do, passing the paths
+    routed so far as existing_routes. Only the testcase routers
+    (maze_router_pins_testcase and maze_router_distance_testcase) take
+    that argument; maze_router.LeeRouter does not. Returns the failed net
+    names and the total cost of the routed ones.
+    """
+    routed_paths = []
+    failed = []
+    total_cost = 0
+    for net_name, pins in order:
+        try:
+            path, cost = router.route_net(net_name, pins, existing_routes=routed_paths)
+        except ValueError:
+            failed.append(net_name)
+            continue
+        routed_paths.append(path)
+        total_cost += cost
+    return failed, total_cost
+
+
+def search_net_orders(router, nets: List[Net], priority: Callable[[Net], tuple],
+                      time_budget: Optional[float] = 10.0, objective: str = "cost", seed: int = 0,
+                      max_workers: int = 1, batch_size: int = 8, swaps: int = 2,
+                      max_candidates: Optional[int] = None) -> Tuple[List[Net], List[Dict[str, object]]]:
+    """
+    Search for the net order that routes best on copies of an unrouted
+    testcase router (see route_in_order). Candidates are evaluated a batch at a time, in a process pool
+    when max_workers > 1:
+
+    1. the first batch: the given order, the priority order and its
+       reverse, and, for each element of the priority key, the nets sorted
+       by that element ascending and descending (ties broken by the full
+       key);
+    2. then batches of batch_size: a reverse-failure-first order (the best
+       order with its failed nets moved to the front, last failure first)
+       and random perturbations of the best order, each swapping one to
+       `swaps` random pairs of nets. Orders already tried are skipped.
+
+    objective "cost" compares total cost only between candidates that route
+    the same nets: a candidate replaces the best when it routes every net
+    the best routes and either routes more or costs less, so dropping a net
+    never pays. "routed" ranks by routed net count, then by total cost.
+    Ties keep the earlier candidate.
+
+    The search stops before the next candidate once time_budget seconds
+    have passed or max_candidates have been evaluated (None disables
+    either; at least one must be set). The first candidate always runs,
+    and at most max_workers candidates are in flight, so the budget is
+    overrun by at most one round of candidates. The sequence of candidates
+    depends only on seed and batch_size, not on max_workers, but where
+    time_budget cuts it depends on wall-clock time and machine load, so
+    the best order can differ between runs. Pass time_budget=None with
+    max_candidates for a reproducible search.
+
+    Returns the best order and one stats entry per candidate. Each entry
+    has the candidate's label, order, routed and failed counts, failed
+    nets, total cost and routing time.
+    """
+    if objective not in ("cost", "routed"):
+        raise ValueError(f"Unknown objective '{objective}', expected 'cost' or 'routed'")
+    if time_budget is None and max_candidates is None:
+        raise ValueError("Net order search needs a time_budget or max_candidates")
+    start_time = time.perf_counter()
+    rng = random.Random(seed)
+    nets = list(nets)
+
+    candidates = [("given", nets), ("net_priority", sorted(nets, key=priority)),
+                  ("net_priority reversed", sorted(nets, key=priority, reverse=True))]
+    key_length = len(priority(nets[0])) if nets else 0
+    for i in range(key_length):
+        candidates.append((f"key[{i}] ascending", sorted(nets, key=lambda net: (priority(net)[i], priority(net)))))
+        candidates.append((f"key[{i}] descending", sorted(nets, key=lambda net: (-priority(net)[i], priority(net)))))
+
+    def out_of_budget(evaluated: int) -> bool:
+        if max_candidates is not None and evaluated >= max_candidates:
+            return True
+        return time_budget is not None and evaluated > 0 and time.perf_counter() - start_time >= time_budget
+
+    stats: List[Dict[str, object]] = []
+    tried = set()
+    best: Optional[Dict[str, object]] = None
+    pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_set_worker_router,
+                               initargs=(router,)) if max_workers > 1 else None
+    try:
+        while candidates:
+            batch = []
+            for label, order in candidates:
+                names = tuple(net_name for net_name, _ in order)
+                if names not in tried:
+                    tried.add(names)
+                    batch.append((label, order))
+            candidates = []
+            if not batch:
+                break
+            # The budget is checked before each candidate is started, not
+            # once per batch, and the pool is only fed as workers free up
+            submitted = []
+            for label, order in batch:
+                if pool is not None:
+                    running = [future for future in submitted if not future.done()]
+                    if len(running) >= max_workers:
+                        wait(running, return_when=FIRST_COMPLETED)
+                if out_of_budget(len(stats) + len(submitted)):
+                    break
+                submitted.append(_evaluate_order(order, router) if pool is None else
+                                 pool.submit(_evaluate_order, order))
+            results = submitted if pool is None else [future.result() for future in submitted]
+
+            for (label, order), (failed, total_cost, route_time) in zip(batch, results):
+                stats.append({
+                    "candidate": label,
+                    "order": [net_name for net_name, _ in order],
+                    "routed": len(order) - len(failed),
+                    "failed": len(failed),
+                    "failed_nets": failed,
+                    "cost": total_cost,
+                    "time": route_time,
+                })
+                if best is None or _is_better(stats[-1], best, objective):
+                    best = stats[-1]
+
+            if out_of_budget(len(stats)) or len(nets) < 2:
+                break
+            by_name = dict(nets)
+            best_order = [(net_name, by_name[net_name]) for net_name in best["order"]]
+            if best["failed_nets"]:
+                failed = list(reversed(best["failed_nets"]))
+                candidates.append(("reverse failure first",
+                                   [(net_name, by_name[net_name]) for net_name in failed] +
+                                   [net for net in best_order if net[0] not in failed]))
+            # A few nets have few orders, so draws that repeat a tried order
+            # are dropped, and the search ends when a batch finds none new
+            new = {tuple(net_name for net_name, _ in order) for _, order in candidates} - tried
+            for _ in range(4 * batch_size):
+                if len(new) >= batch_size:
+                    break
+                order = list(best_order)
+                for _ in range(rng.randint(1, swaps)):
+                    i, j = rng.sample(range(len(order)), 2)
+                    order[i], order[j] = order[j], order[i]
+                names = tuple(net_name for net_name, _ in order)
+                if names not in tried and names not in new:
+                    new.add(names)
+                    candidates.append(("perturbed", order))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    by_name = dict(nets)
+    return [(net_name, by_name[net_name]) for net_name in best["order"]] if best else [], stats
+
+
+def _is_better(entry: Dict[str, object], best: Dict[str, object], objective: str) -> bool:
+    if objective == "routed":
+        return (-entry["routed"], entry["cost"]) < (-best["routed"], best["cost"])
+    failed, best_failed = set(entry["failed_nets"]), set(best["failed_nets"])
+    if not failed <= best_failed:
+        return False
+    return failed < best_failed or entry["cost"] < best["cost"]
+
+
+def _set_worker_router(router):
+    global _worker_router
+    _worker_router = router
+
+
+def _evaluate_order(order: List[Net], router=None) -> Tuple[List[str], float, float]:
+    """Route one candidate order on a fresh copy of router, by default the worker's."""
+    start_time = time.perf_counter()
+    router = copy.deepcopy(_worker_router if router is None else router)
+    failed, total_cost = route_in_order(router, order)
+    return failed, total_cost, time.perf_counter() - start_time
@@ -1,48 +1,69 @@
+import gzip
 import math
 import re
 
-def parse_input_file(file_path):
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-
-    grid_info = lines[0].strip().split(',')
-    N = int(grid_info[0])  
-    M = int(grid_info[1]) 
-    bend_penalty = int(grid_info[2]) 
-    via_penalty = int(grid_info[3])  
-
-    print(f"Parsed dimensions: N={N}, M={M}, Bend Penalty={bend_penalty}, Via Penalty={via_penalty}")
-
-    obstacles = []
-    nets = {}
-
-    for line in lines[1:]:
-        line = line.strip()
-        if line.startswith("OBS"):
-            parts = line.split('(')[1].rstrip(')').split(',')
-            layer, x, y = map(int, parts)
-            if 0 <= x < N and 0 <= y < M:
-                obstacles.append((layer, x, y))
-                # print(f"Valid obstacle added: Layer={layer}, x={x}, y={y}")
-            # else:
-                # print(f"Ignoring invalid obstacle: Layer={layer}, x={x}, y={y}")
-        elif line.startswith("net"):
-            net_name = line.split()[0]
-            pins = []
-            pin_matches = re.findall(r'\(\d+,\s*\d+,\s*\d+\)', line)
-            for pin in pin_matches:
-                layer, x, y = map(int, pin.strip("()").split(','))
+import numpy as np
+
+OBSTACLE_PATTERN = re.compile(r'\(\s*(-?\d+)\s*,\s*(-?\d+)\s*,\s*(-?\d+)\s*\)')
+PIN_PATTERN = re.compile(r'\((\d+),\s*(\d+),\s*(\d+)\)')
+
+def open_input_file(file_path):
+    """Open an input file for reading text, decompressing it if it is gzip."""
+    with open(file_path, 'rb') as file:
+        compressed = file.read(2) == b'\x1f\x8b'
+    if compressed:
+        return gzip.open(file_path, 'rt')
+    return open(file_path, 'r')
+
+def parse_input_file(file_path, as_arrays=False):
+    """
+    Read the grid header, obstacles and nets, one line at a time, so the
+    file is never held in memory and gzip input works too. Pins on an
+    obstacle listed earlier in the file are dropped, checked against a set.
+
+    With as_arrays, obstacles come back as an (n, 3) int array of
+    (layer, x, y) rows and each net's pins as a (k, 3) int array, ready
+    for LeeRouter.add_obstacles and set_obstacles_array.
+    """
+    with open_input_file(file_path) as file:
+        grid_info = next(file).strip().split(',')
+        N = int(grid_info[0])  
+        M = int(grid_info[1]) 
+        bend_penalty = int(grid_info[2]) 
+        via_penalty = int(grid_info[3])  
+
+        print(f"Parsed dimensions: N={N}, M={M}, Bend Penalty={bend_penalty}, Via Penalty={via_penalty}")
+
+        obstacles = []
+        obstacle_set = set()
+        nets = {}
+
+        for line in file:
+            line = line.strip()
+            if line.startswith("OBS"):
+                match = OBSTACLE_PATTERN.search(line)
+                if match is None:
+                    raise ValueError(f"Invalid obstacle line: {line}")
+                layer, x, y = map(int, match.groups())
                 if 0 <= x < N and 0 <= y < M:
-                    if (layer, x, y) not in obstacles:
-                        pins.append((layer, x, y))
-                    # print(f"Valid pin added: Layer={layer}, x={x}, y={y}")
-                # else:
-                #     print(f"Ignoring invalid pin: Layer {layer}, ({x}, {y})")
-            nets[net_name] = pins
-            if not pins:
-                print(f"Warning: Net '{net_name}' has no valid pins and will be skipped.")
-                del nets[net_name]
-
+                    obstacles.append((layer, x, y))
+                    obstacle_set.add((layer, x, y))
+            elif line.startswith("net"):
+                net_name = line.split()[0]
+                pins = []
+                for match in PIN_PATTERN.finditer(line):
+                    layer, x, y = map(int, match.groups())
+                    if 0 <= x < N and 0 <= y < M:
+                        if (layer, x, y) not in obstacle_set:
+                            pins.append((layer, x, y))
+                nets[net_name] = pins
+                if not pins:
+                    print(f"Warning: Net '{net_name}' has no valid pins and will be skipped.")
+                    del nets[net_name]
+
+    if as_arrays:
+        obstacles = np.array(obstacles, dtype=int).reshape(-1, 3)
+        nets = {net_name: np.array(pins, dtype=int).reshape(-1, 3) for net_name, pins in nets.items()}
     return N, M, bend_penalty, via_penalty, obstacles, nets
 
 def initialize_grid(N, M):
@@ -65,6 +86,22 @@ def set_obstacles(grid_M0, grid_M1, obstacles):
             grid_M1[(x, y)]['obstacle'] = True
 
 
+def initialize_grid_array(N, M):
+    """
+    Array form of initialize_grid for both layers: a (2, N, M) float cost
+    grid indexed [layer, x, y], all 1.0. A cell is an obstacle where its
+    cost is inf.
+    """
+    return np.ones((2, N, M))
+
+
+def set_obstacles_array(grid, obstacles):
+    """Array form of set_obstacles: one fancy-indexed assignment for an (n, 3) array of (layer, x, y)."""
+    obstacles = np.asarray(obstacles, dtype=int).reshape(-1, 3)
+    obstacles = obstacles[(obstacles[:, 0] == 0) | (obstacles[:, 0] == 1)]
+    grid[obstacles[:, 0], obstacles[:, 1], obstacles[:, 2]] = math.inf
+
+
 def main():
     
     file_path = "input.txt"
@@ -0,0 +1,92 @@
+from multiprocessing import shared_memory
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+class SharedGrid:
+    """
+    The grid state of a maze_router.LeeRouter in multiprocessing.shared_memory
+    blocks: the obstacle grid, the blocked mask, occupancy and
+    obstacle_distance. Worker processes attach to the blocks and get the
+    same arrays as NumPy views, so nothing is pickled per worker or per
+    task, and attaching costs the same for any grid size.
+
+    Ownership: the process that calls SharedGrid.create owns the blocks. It
+    is the only writer and must call unlink() when it is done. Workers
+    call SharedGrid.attach(grid.spec) and only read. They call close(),
+    or let it happen when they exit.
+
+    Committing: routing only reads the grid. A routed net is committed by
+    the owner's LeeRouter, between the batches of work it hands out. This
+    is how LeeRouter.route_nets commits each wave after all its workers
+    have returned. So no worker reads a cell while it is being written,
+    and no lock is needed. Work that commits while workers are still
+    reading must give every reader a window that the commit does not touch.
+    """
+
+    def __init__(self, height: int, width: int, blocks: Dict[str, shared_memory.SharedMemory], owner: bool):
+        self.height = height
+        self.width = width
+        self.owner = owner
+        self._blocks = blocks
+        arrays = {name: np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf)
+                  for name, (dtype, shape) in self.layout(height, width).items()}
+        self.grid = arrays["grid"]
+        self.blocked = arrays["blocked"]
+        self.occupancy = arrays["occupancy"]
+        self.obstacle_distance = arrays["obstacle_distance"]
+
+    @staticmethod
+    def layout(height: int, width: int) -> Dict[str, Tuple[type, Tuple[int, ...]]]:
+        """dtype and shape of every block; the same arrays LeeRouter allocates for itself."""
+        return {
+            "grid": (np.int64, (2, height, width)),
+            "blocked": (np.bool_, (2 * height * width,)),
+            "occupancy": (np.int32, (2, height, width)),
+            "obstacle_distance": (np.int32, (2, 2, height, width)),
+        }
+
+    @classmethod
+    def create(cls, height: int, width: int) -> "SharedGrid":
+        """Allocate zeroed blocks for a free height x width grid; the caller owns them."""
+        blocks = {}
+        try:
+            for name, (dtype, shape) in cls.layout(height, width).items():
+                size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+                blocks[name] = shared_memory.SharedMemory(create=True, size=size)
+        except BaseException:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+            raise
+        return cls(height, width, blocks, owner=True)
+
+    @classmethod
+    def attach(cls, spec: Tuple[int, int, Dict[str, str]]) -> "SharedGrid":
+        """Map the blocks described by an owner's spec; no data is copied."""
+        height, width, names = spec
+        blocks = {name: shared_memory.SharedMemory(name=block_name) for name, block_name in names.items()}
+        return cls(height, width, blocks, owner=False)
+
+    @property
+    def spec(self) -> Tuple[int, int, Dict[str, str]]:
+        """Small picklable description that SharedGrid.attach takes."""
+        return self.height, self.width, {name: block.name for name, block in self._blocks.items()}
+
+    def close(self):
+        """
+        Drop this process's mapping. Every view of the arrays, including a
+        LeeRouter built on them, must be deleted first.
+        """
+        self.grid = self.blocked = self.occupancy = self.obstacle_distance = None
+        for block in self._blocks.values():
+            block.close()
+
+    def unlink(self):
+        """Owner only: close and free the blocks once no process needs them."""
+        if not self.owner:
+            raise ValueError("Only the process that created a SharedGrid may unlink it")
+        self.close()
+        for block in self._blocks.values():
+            block.unlink()